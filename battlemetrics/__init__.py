@@ -1,61 +1,309 @@
+from __future__ import annotations
+
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 
 #Components
-from battlemetrics.components.banlist import BanList
-from battlemetrics.components.bans import Bans
-from battlemetrics.components.flags import Flags 
-from battlemetrics.components.gameinfo import GameInfo
+# Only what building a client needs is imported up front. Everything else, and aiohttp and numpy with it,
+# is imported the first time it is used, so that importing the package stays cheap for short lived scripts.
 from battlemetrics.components.helpers import Helpers
-from battlemetrics.components.notes import Notes
-from battlemetrics.components.organization import Organization
-from battlemetrics.components.player import Player
-from battlemetrics.components.server import Server
-from battlemetrics.components.session import Session
-    
+from battlemetrics.components.identity import IdentityMap
+from battlemetrics.components.ratelimit import RateLimiter, SharedRateLimiter
+from battlemetrics.components.responses import RESPONSE_MODE, RESPONSE_MODES, LazyDocument, RawResponse
+from battlemetrics.components.tokenpool import TokenPool
+from battlemetrics.components.transport import Transport
+
+if TYPE_CHECKING:
+    from battlemetrics.components.alts import AltDetector
+    from battlemetrics.components.banlist import BanList
+    from battlemetrics.components.bans import Bans
+    from battlemetrics.components.catalog import Catalog
+    from battlemetrics.components.coplay import CoplayGraph
+    from battlemetrics.components.flags import Flags
+    from battlemetrics.components.fleet import FleetMonitor
+    from battlemetrics.components.flagsync import FlagReconciler
+    from battlemetrics.components.gameinfo import GameInfo
+    from battlemetrics.components.hedging import HedgePolicy
+    from battlemetrics.components.notes import Notes
+    from battlemetrics.components.organization import Organization
+    from battlemetrics.components.player import Player
+    from battlemetrics.components.retry import RetryPolicy
+    from battlemetrics.components.server import Server
+    from battlemetrics.components.session import Session
+    from battlemetrics.components.timeseries import TimeSeries
+
+_LAZY = {
+    "AltDetector": "battlemetrics.components.alts",
+    "BanList": "battlemetrics.components.banlist",
+    "Catalog": "battlemetrics.components.catalog",
+    "Bans": "battlemetrics.components.bans",
+    "CoplayGraph": "battlemetrics.components.coplay",
+    "Flags": "battlemetrics.components.flags",
+    "FleetMonitor": "battlemetrics.components.fleet",
+    "FlagReconciler": "battlemetrics.components.flagsync",
+    "GameInfo": "battlemetrics.components.gameinfo",
+    "HedgePolicy": "battlemetrics.components.hedging",
+    "Notes": "battlemetrics.components.notes",
+    "Organization": "battlemetrics.components.organization",
+    "Player": "battlemetrics.components.player",
+    "RetryPolicy": "battlemetrics.components.retry",
+    "Server": "battlemetrics.components.server",
+    "Session": "battlemetrics.components.session",
+    "NDJSONSink": "battlemetrics.components.sinks",
+    "CSVSink": "battlemetrics.components.sinks",
+    "ParquetSink": "battlemetrics.components.sinks",
+    "TimeSeries": "battlemetrics.components.timeseries",
+}
+
+
+def __getattr__(name: str):
+    # PEP 562, keeps `from battlemetrics import Player` and friends working without importing them all up front.
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY))
+
+
+def _load(name: str):
+    return getattr(importlib.import_module(_LAZY[name]), name)
+
 class Battlemetrics:
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, requests_per_minute: float = None, burst: int = 15, tokens: dict = None, token_strategy: str = "round_robin",
+                 shared_limit_path: str = None, retry_policy: RetryPolicy = None, circuit_breakers: bool = True, circuit_breaker_settings: dict = None,
+                 hedge_policy: HedgePolicy = None, coalesce_window: float = 0.25, identity_map: bool = False, transport: Transport = None) -> None:
+        """
+        Args:
+            api_key (str): Your battlemetrics API token.
+            requests_per_minute (float, optional): Client side rate limit shared by every request, per token. Defaults to None (off).
+            burst (int, optional): How many requests may go out back to back before the rate limit applies. Defaults to 15.
+            tokens (dict, optional): Extra tokens to spread reads over, as {token: [organization IDs it writes for]}.
+                The api_key can be listed here too to give it organizations. Each token gets its own rate limit. Defaults to None.
+            token_strategy (str, optional): "round_robin" or "least_loaded" for routing reads. Defaults to "round_robin".
+            shared_limit_path (str, optional): Keep the rate limit in this file so every process using the same path shares it.
+                With several tokens, each token gets its own file next to it. Defaults to None (per process limits).
+            retry_policy (RetryPolicy, optional): Retries, backoff and timeouts for every request. Defaults to RetryPolicy().
+            circuit_breakers (bool, optional): Fail fast on endpoints that keep erroring. Defaults to True.
+            circuit_breaker_settings (dict, optional): Keyword arguments for each CircuitBreaker, e.g. {"reset_timeout": 60}. Defaults to None.
+            hedge_policy (HedgePolicy, optional): Send a duplicate of slow GETs and take the first answer. Defaults to None (off).
+            coalesce_window (float, optional): Seconds appends to the same ban or note wait to be merged into one write. Defaults to 0.25.
+            identity_map (bool, optional): Share one object per included resource across every decoded response, see IdentityMap. Defaults to False.
+            transport (Transport, optional): Record requests to a cassette or replay them from one, see Transport. Defaults to None (straight to the network).
+        """
+
         self.base_url = "https://api.battlemetrics.com"
         self.api_key = api_key
-    
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.shared_limit_path = shared_limit_path
+        if shared_limit_path and not requests_per_minute:
+            raise ValueError("shared_limit_path needs requests_per_minute, there is no rate limit to share without it.")
+        limiter = self._make_limiter(api_key)
+        token_pool = None
+        if tokens:
+            token_pool = TokenPool(strategy=token_strategy, requests_per_minute=requests_per_minute, burst=burst)
+            # The main token comes first so it is the fallback for writes that don't belong to a known organization.
+            token_pool.add(api_key, organization_ids=tokens.get(api_key), limiter=limiter)
+            for token, organization_ids in tokens.items():
+                if token != api_key:
+                    token_pool.add(token, organization_ids=organization_ids, limiter=self._make_limiter(token))
+        self._helpers = Helpers(api_key=api_key, limiter=limiter, token_pool=token_pool, retry_policy=retry_policy,
+                                circuit_breakers=circuit_breakers, circuit_breaker_settings=circuit_breaker_settings,
+                                hedge_policy=hedge_policy, coalesce_window=coalesce_window,
+                                identity_map=IdentityMap() if identity_map else None, transport=transport)
+        self._components = {}
+
+    async def __aenter__(self) -> "Battlemetrics":
+        """`async with Battlemetrics(token) as api:` reuses one pooled HTTP session for every request inside the block."""
+
+        await self.helpers.open_session()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the pooled HTTP session, if one is open, and saves the cassette of a recording transport."""
+
+        await self.helpers.close()
+
+    @contextmanager
+    def response_mode(self, mode: str):
+        """Changes what requests made inside the block return.
+        "raw" returns a RawResponse with the status, headers and undecoded body, for relaying or caching.
+        "lazy" returns a LazyDocument that only decodes the JSON once something in it is read. "decoded" is the normal behaviour.
+        Paginating helpers stop after the first page in raw mode, there are no links to follow without decoding.
+        Args:
+            mode (str): "decoded", "raw" or "lazy".
+        """
+
+        if mode not in RESPONSE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(RESPONSE_MODES)}.")
+        token = RESPONSE_MODE.set(mode)
+        try:
+            yield self
+        finally:
+            RESPONSE_MODE.reset(token)
+
+    def _make_limiter(self, token: str) -> RateLimiter:
+        if not self.requests_per_minute:
+            return None
+        if not self.shared_limit_path:
+            return RateLimiter(requests_per_minute=self.requests_per_minute, burst=self.burst)
+        path = self.shared_limit_path
+        if token != self.api_key:
+            path = f"{path}.{hashlib.sha1(token.encode()).hexdigest()[:12]}"
+        return SharedRateLimiter(path=path, requests_per_minute=self.requests_per_minute, burst=self.burst)
+
+    def _component(self, component_class):
+        # One instance per component so that caches and the rate limiter are shared between calls.
+        component = self._components.get(component_class)
+        if component is None:
+            component = component_class(helpers=self.helpers, base_url=self.base_url)
+            self._components[component_class] = component
+        return component
+
     @property
     def helpers(self) -> Helpers:
-        return Helpers(api_key=self.api_key)
+        return self._helpers
     
     @property
     def player(self) -> Player:
-        return Player(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Player"))
     
     @property
     def server(self) -> Server:
-        return Server(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Server"))
     
     @property
     def notes(self) -> Notes:
-        return Notes(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Notes"))
     
     @property
     def flags(self) -> Flags:
-        return Flags(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Flags"))
     
     @property
     def session(self) -> Session:
-        return Session(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Session"))
     
     @property
     def banlist(self) -> BanList:
-        return BanList(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("BanList"))
     
     @property
     def organization(self) -> Organization:
-        return Organization(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Organization"))
     
     @property
     def gameinfo(self) -> GameInfo:
-        return GameInfo(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("GameInfo"))
     
     @property
     def bans(self) -> Bans:
-        return Bans(helpers=self.helpers, base_url=self.base_url)
+        return self._component(_load("Bans"))
+
+    def coplay_graph(self, concurrency: int = 5) -> CoplayGraph:
+        """Creates an empty coplay graph that fetches through this client.
+        Args:
+            concurrency (int, optional): How many coplay lookups may run at once. Defaults to 5.
+        Returns:
+            CoplayGraph: Call expand() on it to start building.
+        """
+
+        return _load("CoplayGraph")(player=self.player, session=self.session, concurrency=concurrency)
+
+    def alt_detector(self, weights: dict = None, threshold: float = 1.0, concurrency: int = 5, requests_per_minute: float = 60,
+                     burst: int = 15) -> AltDetector:
+        """Creates an empty alt detector that fetches through this client.
+        Args:
+            weights (dict, optional): Weight per identifier type. Defaults to DEFAULT_WEIGHTS in battlemetrics.components.alts.
+            threshold (float, optional): Total weight needed to link two players. Defaults to 1.0.
+            concurrency (int, optional): How many identifier lookups may run at once. Defaults to 5.
+            requests_per_minute (float, optional): Rate limit of the detector's own lookups. None disables it. Defaults to 60.
+            burst (int, optional): How many lookups may go out back to back before that rate limit applies. Defaults to 15.
+        Returns:
+            AltDetector: Call add_players() on it to start building.
+        """
+
+        limiter = RateLimiter(requests_per_minute=requests_per_minute, burst=burst) if requests_per_minute else None
+        return _load("AltDetector")(player=self.player, weights=weights, threshold=threshold, concurrency=concurrency, limiter=limiter)
+
+    def flag_reconciler(self, concurrency: int = 5, organization_id: int = None) -> FlagReconciler:
+        """Creates a reconciler that syncs a desired player -> flags mapping through this client.
+        Args:
+            concurrency (int, optional): How many reads or writes may run at once. Defaults to 5.
+            organization_id (int, optional): Only read flagged players of this organization. Defaults to None.
+        Returns:
+            FlagReconciler: Call reconcile() on it with the desired state.
+        """
+
+        return _load("FlagReconciler")(player=self.player, concurrency=concurrency, organization_id=organization_id)
+
+    def catalog(self, path: str = None, max_age: float = 86400) -> Catalog:
+        """Creates a catalog of games, features and feature options that fetches through this client.
+        Args:
+            path (str, optional): Snapshot file to load at startup and keep up to date. Defaults to None (memory only).
+            max_age (float, optional): Seconds before the snapshot is refreshed in the background. Defaults to 86400.
+        Returns:
+            Catalog: Call ensure() on it to load or fetch it.
+        """
+
+        return _load("Catalog")(gameinfo=self.gameinfo, path=path, max_age=max_age)
+
+    def fleet_monitor(self, server_ids: list = None, fields: tuple = None, concurrency: int = 8, min_interval: float = 15, max_interval: float = 300) -> FleetMonitor:
+        """Creates a monitor that polls servers through this client and yields what changed.
+        Args:
+            server_ids (list, optional): Servers to watch. Defaults to None.
+            fields (tuple, optional): Attributes to watch. Defaults to name, players, maxPlayers, status, rank and details.map.
+            concurrency (int, optional): How many polls may run at once. Defaults to 8.
+            min_interval (float, optional): Shortest wait between two polls of a server, in seconds. Defaults to 15.
+            max_interval (float, optional): Longest wait between two polls of a server, in seconds. Defaults to 300.
+        Returns:
+            FleetMonitor: Iterate over events() on it.
+        """
+
+        return _load("FleetMonitor")(server=self.server, server_ids=server_ids, fields=fields, concurrency=concurrency,
+                                     min_interval=min_interval, max_interval=max_interval)
+
+    async def load_token_scopes(self) -> list:
+        """Introspects every pooled token so that inactive tokens stop receiving requests, and each token only gets the endpoints its scopes allow.
+        Returns:
+            list: Per token stats, including the scopes that were found.
+        """
+
+        if not self.helpers.token_pool:
+            return []
+        await self.helpers.token_pool.load_scopes(self.check_api_scopes)
+        return self.helpers.token_pool.stats()
+
+    def instrumentation(self) -> dict:
+        """A snapshot of the client's internal state for logging or dashboards.
+        Returns:
+            dict: Circuit breaker state per endpoint, rate limiter tokens and pooled token stats.
+        """
+
+        return {
+            "circuit_breakers": self.helpers.breaker_stats(),
+            "rate_limiter": {"available": self.helpers.limiter.available} if self.helpers.limiter else None,
+            "tokens": self.helpers.token_pool.stats() if self.helpers.token_pool else None,
+            "hedging": self.helpers.hedge_policy.stats() if self.helpers.hedge_policy else None,
+            "coalesced_writes": self.helpers.coalescer.stats(),
+            "identity_map": self.helpers.identity_map.stats() if self.helpers.identity_map is not None else None,
+            "transport": self.helpers.transport.stats() if self.helpers.transport is not None else None,
+        }
 
     def check_api_scopes(self, token: str = None) -> dict:
         """Retrieves the tokens scopes from the oauth.
@@ -73,9 +321,9 @@ class Battlemetrics:
         data = {
             "token": token
         }
-        return self.helpers._make_request(method="POST", url=url, json_dict=data)
+        return self.helpers._make_request(method="POST", url=url, json_dict=data, idempotent=True)
 
-    def metrics(self, name: str = "games.rust.players", start_date: str = None, end_date: str = None, resolution: str = "60") -> dict:
+    async def metrics(self, name: str = "games.rust.players", start_date: str = None, end_date: str = None, resolution: str = "60", as_series: bool = False) -> dict:
         """A data point as used in time series information.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-dataPoint-/metrics
         Args:
@@ -83,8 +331,9 @@ class Battlemetrics:
             start_date (str, optional) UTC time format. Defaults to Current Date.
             end_date (str, optional): UTC time format. Defaults to 1 day ago.
             resolution (str, optional): raw, 30, 60 or 1440. Defaults to "60".
+            as_series (bool, optional): Return a compact TimeSeries instead of the raw response. Defaults to False.
         Returns:
-            dict: a bunch of numbers.
+            dict: a bunch of numbers, or a TimeSeries if as_series is set.
         """
 
         url = f"{self.base_url}/metrics"
@@ -101,7 +350,10 @@ class Battlemetrics:
             "metrics[0][resolution]": resolution,
             "fields[dataPoint]": "name,group,timestamp,value"
         }
-        return self.helpers._make_request(method="GET", url=url, params=data)
+        response = await self.helpers._make_request(method="GET", url=url, params=data)
+        if as_series:
+            return _load("TimeSeries").from_response(response, name=name, metric=name)
+        return response
 
     def activity_logs(self, filter_bmid: int = None, filter_search: str = None, filter_servers: int = None, blacklist: str = None, whitelist: str = None) -> dict:
         """Retrieves the activity logs.
@@ -118,6 +370,11 @@ class Battlemetrics:
         """
 
         url = f"{self.base_url}/activity"
+        data = self._activity_params(filter_bmid=filter_bmid, filter_search=filter_search, filter_servers=filter_servers,
+                                     blacklist=blacklist, whitelist=whitelist)
+        return self.helpers._make_request(method="GET", url=url, params=data)
+
+    def _activity_params(self, filter_bmid: int = None, filter_search: str = None, filter_servers: int = None, blacklist: str = None, whitelist: str = None) -> dict:
         data = {
             "page[size]": "100",
             "include": "organization,server,user,player"
@@ -133,5 +390,75 @@ class Battlemetrics:
             data['filter[search]'] = filter_search
         if filter_bmid:
             data['filter[players]'] = filter_bmid
-        
-        return self.helpers._make_request(method="GET", url=url, params=data)
\ No newline at end of file
+        return data
+
+    @staticmethod
+    def _save_cursor(cursor_file: str, cursor: dict) -> None:
+        with open(f"{cursor_file}.tmp", 'w') as f:
+            json.dump(cursor, f)
+        os.replace(f"{cursor_file}.tmp", cursor_file)
+
+    async def tail_activity(self, filter_bmid: int = None, filter_search: str = None, filter_servers: int = None, blacklist: str = None, whitelist: str = None,
+                            cursor_file: str = None, backfill: bool = False, min_interval: float = 2.0, max_interval: float = 60.0):
+        """Follows the activity log, yielding each new entry once, oldest first.
+        Only entries at or after the newest timestamp already seen are requested, and the IDs seen at that timestamp are used to drop repeats.
+        The poll interval halves while events are arriving and grows when the feed is quiet.
+        Args:
+            filter_bmid (int, optional): A battlemetrics ID for a specific user. Defaults to None.
+            filter_search (str, optional): What do you want to search?. Defaults to None.
+            filter_servers (int, optional): A specific battlemetrics server ID. Defaults to None.
+            blacklist (str, optional): Example: unknown, playerMessage. Defaults to None.
+            whitelist (str, optional): unknown, playerMessage. Defaults to None.
+            cursor_file (str, optional): Where to persist the high-water mark so a restart resumes where it left off. It moves past
+                an entry once the next one is asked for, so after a crash the entry being handled is yielded again. Defaults to None.
+            backfill (bool, optional): Without a saved cursor, also yield the latest page instead of starting from now. Defaults to False.
+            min_interval (float, optional): Shortest wait between polls in seconds. Defaults to 2.0.
+            max_interval (float, optional): Longest wait between polls in seconds. Defaults to 60.0.
+        Yields:
+            dict: Each activity log entry.
+        """
+
+        url = f"{self.base_url}/activity"
+        params = self._activity_params(filter_bmid=filter_bmid, filter_search=filter_search, filter_servers=filter_servers,
+                                       blacklist=blacklist, whitelist=whitelist)
+        cursor = {"timestamp": None, "ids": []}
+        if cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file, 'r') as f:
+                cursor = json.load(f)
+        first_poll = cursor['timestamp'] is None
+        interval = min_interval
+
+        while True:
+            data = dict(params)
+            if cursor['timestamp']:
+                data['filter[timestamp]'] = f"{cursor['timestamp']}:"
+            entries = []
+            async for page in self.helpers._paginate(url=url, params=data, max_pages=1 if first_poll else None):
+                if isinstance(page, Mapping):
+                    entries.extend(page.get('data') or [])
+
+            seen = set(cursor['ids'])
+            entries = [entry for entry in entries if entry.get('id') not in seen]
+            entries.sort(key=lambda entry: entry['attributes']['timestamp'])
+
+            if entries:
+                deliver = not first_poll or backfill
+                for entry in entries:
+                    if deliver:
+                        yield entry
+                    # Only moved past an entry once the consumer asked for the next one, so an entry that was being
+                    # handled when the consumer raised or stopped is sent again after a restart rather than lost.
+                    timestamp = entry['attributes']['timestamp']
+                    if timestamp == cursor['timestamp']:
+                        cursor = {"timestamp": timestamp, "ids": cursor['ids'] + [entry['id']]}
+                    else:
+                        cursor = {"timestamp": timestamp, "ids": [entry['id']]}
+                    if cursor_file and deliver:
+                        self._save_cursor(cursor_file, cursor)
+                if cursor_file and not deliver:
+                    self._save_cursor(cursor_file, cursor)
+                interval = max(min_interval, interval / 2)
+            else:
+                interval = min(max_interval, interval * 1.5)
+            first_poll = False
+            await asyncio.sleep(interval)
\ No newline at end of file
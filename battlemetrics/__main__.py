@@ -0,0 +1,5 @@
+import sys
+
+from battlemetrics.cli import main
+
+sys.exit(main())
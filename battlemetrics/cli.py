@@ -0,0 +1,253 @@
+"""Command line interface for the wrapper.
+
+    battlemetrics players search --search "name" --server 123 --server 456
+    battlemetrics bans export --organization 1 --output bans.cfg
+    battlemetrics activity tail --server 123 --cursor-file activity.cursor
+
+Results are written to stdout as NDJSON, one resource per line, as each page arrives. Anything the
+library prints (rate limit waits, retries, API errors) goes to stderr so the output can be piped.
+The token comes from --token or the BATTLEMETRICS_TOKEN environment variable.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+from collections.abc import Mapping
+
+from battlemetrics import Battlemetrics
+
+TOKEN_ENV = "BATTLEMETRICS_TOKEN"
+
+
+def select_fields(item: dict, fields: list) -> dict:
+    """Picks dotted paths out of a resource, e.g. ["id", "attributes.name"] -> {"id": ..., "attributes.name": ...}."""
+
+    selected = {}
+    for field in fields:
+        value = item
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        selected[field] = value
+    return selected
+
+
+class Output:
+    """Writes resources to a stream as NDJSON, trimmed to the selected fields, until max_items have been written."""
+
+    def __init__(self, stream, fields: list = None, max_items: int = None) -> None:
+        self.stream = stream
+        self.fields = fields
+        self.max_items = max_items
+        self.written = 0
+
+    @property
+    def full(self) -> bool:
+        return self.max_items is not None and self.written >= self.max_items
+
+    def write(self, items: list) -> bool:
+        """Writes a batch and flushes it. Returns False once max_items is reached."""
+
+        for item in items:
+            if self.full:
+                break
+            if self.fields:
+                item = select_fields(item, self.fields)
+            self.stream.write(json.dumps(item, separators=(",", ":"), default=str))
+            self.stream.write("\n")
+            self.written += 1
+        self.stream.flush()
+        return not self.full
+
+
+async def drain(output: Output, sources: list, concurrency: int) -> None:
+    """Runs the sources, at most `concurrency` at a time, writing each batch they yield as soon as it arrives."""
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(source):
+        async with semaphore:
+            if output.full:
+                return
+            batches = source()
+            try:
+                async for batch in batches:
+                    if not output.write(batch):
+                        break
+            finally:
+                await batches.aclose()
+
+    await asyncio.gather(*(run(source) for source in sources))
+
+
+def paginated(api: Battlemetrics, path: str, params: dict):
+    async def pages():
+        async for page in api.helpers._paginate(url=f"{api.base_url}{path}", params=params):
+            if not isinstance(page, Mapping) or page.get('errors'):
+                raise Exception(f"Request to {path} failed: {page}")
+            yield page.get('data') or []
+    return pages
+
+
+def each(values: list) -> list:
+    # Repeatable ID options fan out into one source per value. No values means one unfiltered source.
+    return values or [None]
+
+
+async def players_search(api: Battlemetrics, args, output: Output) -> None:
+    sources = [paginated(api, "/players", api.player._search_params(search=args.search, filter_online=args.online, filter_servers=server,
+                                                                     filter_organization=args.organization, filter_public=args.public, flag=args.flag))
+               for server in each(args.server)]
+    await drain(output, sources, args.concurrency)
+
+
+async def bans_search(api: Battlemetrics, args, output: Output) -> None:
+    sources = [paginated(api, "/bans", api.bans._search_params(search=args.search, player_id=args.player, banlist=args.banlist, expired=not args.active,
+                                                               exempt=args.exempt, server=args.server, organization_id=organization, userIDs=args.user))
+               for organization in each(args.organization)]
+    await drain(output, sources, args.concurrency)
+
+
+async def bans_export(api: Battlemetrics, args, output: Output) -> None:
+    path = args.output
+    if not path:
+        handle, path = tempfile.mkstemp(suffix=".cfg")
+        os.close(handle)
+    try:
+        result = await api.banlist.rust_banlist_export(organization_id=args.organization, server_id=args.server, to_file=path)
+        if result != path:
+            raise Exception(f"Export failed: {result}")
+        batch = []
+        for ban in api.banlist.iter_export(path):
+            batch.append(ban)
+            if len(batch) >= 1000:
+                if not output.write(batch):
+                    return
+                batch = []
+        output.write(batch)
+    finally:
+        if not args.output and os.path.exists(path):
+            os.remove(path)
+
+
+async def sessions(api: Battlemetrics, args, output: Output) -> None:
+    targets = [(player, None) for player in args.player] + [(None, server) for server in args.server]
+    sources = [paginated(api, "/sessions", api.session._info_params(filter_server=server, filter_game=args.game, filter_organizations=args.organization,
+                                                                    filter_player=player, filter_identifiers=args.identifier))
+               for player, server in targets or [(None, None)]]
+    await drain(output, sources, args.concurrency)
+
+
+async def activity_tail(api: Battlemetrics, args, output: Output) -> None:
+    async for entry in api.tail_activity(filter_bmid=args.player, filter_search=args.search, filter_servers=args.server, blacklist=args.blacklist,
+                                         whitelist=args.whitelist, cursor_file=args.cursor_file, backfill=args.backfill):
+        if not output.write([entry]):
+            return
+
+
+async def audit_sync(api: Battlemetrics, args, output: Output) -> None:
+    from battlemetrics.components.auditsync import AuditLogStore
+
+    with AuditLogStore(args.store) as store:
+        def source(organization):
+            async def summary():
+                yield [{"organization": organization, **await api.organization.sync_auditlogs(organization_id=organization, store=store)}]
+            return summary
+        await drain(output, [source(organization) for organization in args.organization], args.concurrency)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="battlemetrics", description="Query the Battlemetrics API and stream the results as NDJSON.")
+    parser.add_argument("--token", default=None, help=f"API token. Defaults to the {TOKEN_ENV} environment variable.")
+    parser.add_argument("--concurrency", type=int, default=4, help="How many queries run at once when a command fans out. Defaults to 4.")
+    parser.add_argument("--max-items", type=int, default=None, help="Stop after writing this many items.")
+    parser.add_argument("--fields", default=None, help="Comma separated dotted paths to keep, e.g. id,attributes.name.")
+    parser.add_argument("--requests-per-minute", type=float, default=60, help="Client side rate limit. Defaults to 60.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    players = commands.add_parser("players", help="Players.").add_subparsers(dest="action", required=True)
+    search = players.add_parser("search", help="Search players.")
+    search.add_argument("--search", default=None)
+    search.add_argument("--server", action="append", default=[], help="Server ID, repeat for several.")
+    search.add_argument("--organization", default=None)
+    search.add_argument("--flag", default=None, help="Only players with this flag ID.")
+    search.add_argument("--online", action="store_true")
+    search.add_argument("--public", action="store_true")
+    search.set_defaults(handler=players_search)
+
+    bans = commands.add_parser("bans", help="Bans.").add_subparsers(dest="action", required=True)
+    search = bans.add_parser("search", help="Search bans.")
+    search.add_argument("--search", default=None)
+    search.add_argument("--player", default=None)
+    search.add_argument("--banlist", default=None)
+    search.add_argument("--server", default=None)
+    search.add_argument("--organization", action="append", default=[], help="Organization ID, repeat for several.")
+    search.add_argument("--user", default=None, help="ID of the admin who made the ban.")
+    search.add_argument("--active", action="store_true", help="Leave out expired bans.")
+    search.add_argument("--exempt", action="store_true")
+    search.set_defaults(handler=bans_search)
+    export = bans.add_parser("export", help="Export a rust banlist, one ban per line.")
+    export.add_argument("--organization", required=True)
+    export.add_argument("--server", default=None)
+    export.add_argument("--output", default=None, help="Keep the downloaded export at this path.")
+    export.set_defaults(handler=bans_export)
+
+    session = commands.add_parser("sessions", help="Sessions of players or servers.")
+    session.add_argument("--player", action="append", default=[], help="Player ID, repeat for several.")
+    session.add_argument("--server", action="append", default=[], help="Server ID, repeat for several.")
+    session.add_argument("--organization", default=None)
+    session.add_argument("--game", default=None)
+    session.add_argument("--identifier", default=None)
+    session.set_defaults(handler=sessions)
+
+    activity = commands.add_parser("activity", help="Activity log.").add_subparsers(dest="action", required=True)
+    tail = activity.add_parser("tail", help="Follow the activity log.")
+    tail.add_argument("--player", default=None)
+    tail.add_argument("--search", default=None)
+    tail.add_argument("--server", default=None)
+    tail.add_argument("--blacklist", default=None)
+    tail.add_argument("--whitelist", default=None)
+    tail.add_argument("--cursor-file", default=None, help="Resume from and save the position here.")
+    tail.add_argument("--backfill", action="store_true", help="Start with the latest page instead of from now.")
+    tail.set_defaults(handler=activity_tail)
+
+    audit = commands.add_parser("audit", help="Organization audit logs.").add_subparsers(dest="action", required=True)
+    sync = audit.add_parser("sync", help="Sync audit logs into an SQLite file, one summary line per organization.")
+    sync.add_argument("--organization", action="append", required=True, help="Organization ID, repeat for several.")
+    sync.add_argument("--store", required=True, help="Path of the SQLite file.")
+    sync.set_defaults(handler=audit_sync)
+    return parser
+
+
+async def run(args, stream) -> None:
+    output = Output(stream, fields=[field for field in (args.fields or "").split(",") if field] or None, max_items=args.max_items)
+    async with Battlemetrics(args.token, requests_per_minute=args.requests_per_minute or None) as api:
+        await args.handler(api, args, output)
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.token = args.token or os.environ.get(TOKEN_ENV)
+    if not args.token:
+        print(f"No API token, pass --token or set {TOKEN_ENV}.", file=sys.stderr)
+        return 2
+    stream = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(run(args, stream))
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head). Point stdout at devnull so the flush at exit doesn't fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except Exception as e:
+        print(f"battlemetrics: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
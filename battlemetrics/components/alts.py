@@ -0,0 +1,183 @@
+import asyncio
+from collections.abc import Mapping
+
+from battlemetrics.components.player import Player
+from battlemetrics.components.ratelimit import RateLimiter
+
+# How much a single shared identifier counts towards linking two players.
+DEFAULT_WEIGHTS = {
+    "BEGUID": 1.0,
+    "legacyBEGUID": 1.0,
+    "steamFamilyShareOwner": 1.0,
+    "battlebitHWID": 1.0,
+    "ip": 0.5,
+    "name": 0.0,
+}
+
+
+class AltDetector:
+    """Clusters players that share identifiers, using Player.identifiers as the source.
+    Two players are joined once the weights of the distinct identifiers they share reach the threshold.
+    Clusters live in a union-find index, so looking up a player's cluster is near constant time
+    and new evidence is merged in without rebuilding anything.
+    """
+
+    def __init__(self, player: Player, weights: dict = None, threshold: float = 1.0, default_weight: float = 0.5, concurrency: int = 5,
+                 limiter: RateLimiter = None) -> None:
+        self.player = player
+        # A walk over related players fans out quickly, so it is rate limited on its own even when the client is not.
+        self.limiter = limiter
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.threshold = threshold
+        self.default_weight = default_weight
+        self.concurrency = concurrency
+        self.evidence = {}
+        self._parent = {}
+        self._members = {}
+        self._fetched = {}
+        self._in_flight = {}
+
+    def _add_node(self, player_id: str) -> None:
+        if player_id not in self._parent:
+            self._parent[player_id] = player_id
+            self._members[player_id] = {player_id}
+
+    def find(self, player_id) -> str:
+        """Returns the representative player of the cluster the player is in."""
+
+        player_id = str(player_id)
+        self._add_node(player_id)
+        parent = self._parent
+        while parent[player_id] != player_id:
+            parent[player_id] = parent[parent[player_id]]
+            player_id = parent[player_id]
+        return player_id
+
+    def union(self, player_a, player_b) -> str:
+        """Merges the clusters of two players and returns the new representative."""
+
+        root_a, root_b = self.find(player_a), self.find(player_b)
+        if root_a == root_b:
+            return root_a
+        if len(self._members[root_a]) < len(self._members[root_b]):
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._members[root_a] |= self._members.pop(root_b)
+        return root_a
+
+    def add_link(self, player_a, player_b, identifier_type: str, identifier: str) -> bool:
+        """Records that two players share an identifier. Returns True if they are now in the same cluster."""
+
+        player_a, player_b = str(player_a), str(player_b)
+        self._add_node(player_a)
+        self._add_node(player_b)
+        if player_a == player_b:
+            return True
+        pair = (player_a, player_b) if player_a < player_b else (player_b, player_a)
+        shared = self.evidence.setdefault(pair, {})
+        shared[(identifier_type, str(identifier))] = self.weights.get(identifier_type, self.default_weight)
+        if sum(shared.values()) >= self.threshold:
+            self.union(player_a, player_b)
+            return True
+        return self.find(player_a) == self.find(player_b)
+
+    def add_identifiers(self, player_id, response: dict) -> list:
+        """Merges a Player.identifiers response into the index.
+        Returns:
+            list: The related player IDs found in the response.
+        """
+
+        player_id = str(player_id)
+        self._add_node(player_id)
+        related = []
+        for item in (response or {}).get('data') or []:
+            owner = (((item.get('relationships') or {}).get('player') or {}).get('data') or {}).get('id')
+            if not owner or str(owner) == player_id:
+                continue
+            attributes = item.get('attributes') or {}
+            identifier_type = attributes.get('type')
+            identifier = attributes.get('identifier') or item.get('id')
+            self.add_link(player_id, owner, identifier_type, identifier)
+            related.append(str(owner))
+        return related
+
+    async def _fetch(self, player_id: str, semaphore: asyncio.Semaphore) -> dict:
+        if player_id in self._fetched:
+            return self._fetched[player_id]
+        if player_id in self._in_flight:
+            return await self._in_flight[player_id]
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[player_id] = future
+        try:
+            async with semaphore:
+                response = await self._read_identifiers(player_id)
+            self._fetched[player_id] = response
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[player_id]
+
+    async def _read_identifiers(self, player_id: str) -> dict:
+        # Same request as Player.identifiers, but following every page so links past the first 100 identifiers count too.
+        url = f"{self.player.base_url}/players/{player_id}/relationships/related-identifiers"
+        response = {"data": [], "included": []}
+        if self.limiter:
+            await self.limiter.acquire()
+        async for page in self.player.helpers._paginate(url=url, params={"include": "player,identifier", "page[size]": "100"}):
+            if not isinstance(page, Mapping) or page.get('errors'):
+                return page
+            response['data'].extend(page.get('data') or [])
+            response['included'].extend(page.get('included') or [])
+            if self.limiter and (page.get('links') or {}).get('next'):
+                await self.limiter.acquire()
+        return response
+
+    async def add_players(self, player_ids: list, depth: int = 1) -> "AltDetector":
+        """Fetches related identifiers for the players and merges them in, following related players.
+        Players already fetched are not requested again. Requests go through the detector's limiter and the client's, if any.
+        Args:
+            player_ids (list): Battlemetrics IDs to start from.
+            depth (int, optional): How many hops of related players to follow. Defaults to 1.
+        Returns:
+            AltDetector: This detector, for chaining.
+        """
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        frontier = list(dict.fromkeys(str(player_id) for player_id in player_ids))
+        visited = set(frontier)
+        for _ in range(depth):
+            responses = await asyncio.gather(*(self._fetch(node, semaphore) for node in frontier))
+            next_frontier = []
+            for node, response in zip(frontier, responses):
+                for related in self.add_identifiers(node, response):
+                    if related not in visited:
+                        visited.add(related)
+                        next_frontier.append(related)
+            frontier = next_frontier
+        return self
+
+    def cluster(self, player_id) -> set:
+        """Returns every player in the same cluster as the given player."""
+
+        return set(self._members[self.find(player_id)])
+
+    def same_cluster(self, player_a, player_b) -> bool:
+        return self.find(player_a) == self.find(player_b)
+
+    def clusters(self, min_size: int = 2) -> list:
+        """Returns every cluster with at least min_size players, largest first."""
+
+        clusters = [set(members) for members in self._members.values() if len(members) >= min_size]
+        clusters.sort(key=len, reverse=True)
+        return clusters
+
+    def shared_identifiers(self, player_a, player_b) -> dict:
+        """Returns {(identifier type, identifier): weight} for what two players directly share."""
+
+        player_a, player_b = str(player_a), str(player_b)
+        pair = (player_a, player_b) if player_a < player_b else (player_b, player_a)
+        return dict(self.evidence.get(pair, {}))
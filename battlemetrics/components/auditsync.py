@@ -0,0 +1,100 @@
+import json
+import sqlite3
+
+
+class AuditLogStore:
+    """Local SQLite copy of an organization's audit log.
+    Entries are keyed by ID and included resources by (type, id), so every resource is stored once
+    no matter how many entries or pages reference it. The newest synced timestamp is kept per organization.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id TEXT PRIMARY KEY,
+                organization_id TEXT NOT NULL,
+                timestamp TEXT,
+                document TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (organization_id, timestamp);
+            CREATE TABLE IF NOT EXISTS included (
+                type TEXT NOT NULL,
+                id TEXT NOT NULL,
+                document TEXT NOT NULL,
+                PRIMARY KEY (type, id)
+            );
+            CREATE TABLE IF NOT EXISTS cursors (
+                organization_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL
+            );
+        """)
+
+    def __enter__(self) -> "AuditLogStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def cursor(self, organization_id) -> str:
+        """Returns the newest timestamp synced for the organization, or None."""
+
+        row = self.connection.execute("SELECT timestamp FROM cursors WHERE organization_id = ?", (str(organization_id),)).fetchone()
+        return row[0] if row else None
+
+    def known(self, entry_ids: list) -> set:
+        """Returns which of the given entry IDs are already stored."""
+
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            return set()
+        placeholders = ",".join("?" * len(entry_ids))
+        rows = self.connection.execute(f"SELECT id FROM entries WHERE id IN ({placeholders})", entry_ids)
+        return {row[0] for row in rows}
+
+    def save_page(self, organization_id, entries: list, included: list) -> None:
+        """Stores a page of entries and their included resources in one transaction."""
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO entries (id, organization_id, timestamp, document) VALUES (?, ?, ?, ?)",
+                [(entry['id'], str(organization_id), (entry.get('attributes') or {}).get('timestamp'), json.dumps(entry, separators=(',', ':')))
+                 for entry in entries])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO included (type, id, document) VALUES (?, ?, ?)",
+                [(resource['type'], resource['id'], json.dumps(resource, separators=(',', ':'))) for resource in included])
+
+    def set_cursor(self, organization_id, timestamp: str) -> None:
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO cursors (organization_id, timestamp) VALUES (?, ?)", (str(organization_id), timestamp))
+
+    def entries(self, organization_id=None):
+        """Yields stored entries oldest first."""
+
+        if organization_id is None:
+            rows = self.connection.execute("SELECT document FROM entries ORDER BY timestamp")
+        else:
+            rows = self.connection.execute("SELECT document FROM entries WHERE organization_id = ? ORDER BY timestamp", (str(organization_id),))
+        for row in rows:
+            yield json.loads(row[0])
+
+    def resource(self, resource_type: str, resource_id: str) -> dict:
+        """Returns a stored included resource, or None."""
+
+        row = self.connection.execute("SELECT document FROM included WHERE type = ? AND id = ?", (resource_type, str(resource_id))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def export_ndjson(self, path: str, organization_id=None) -> int:
+        """Writes the stored entries to a newline delimited JSON file. Returns the number of lines written."""
+
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in self.entries(organization_id):
+                f.write(json.dumps(entry, separators=(',', ':')))
+                f.write("\n")
+                count += 1
+        return count
@@ -5,16 +5,17 @@ class BanList:
         self.helpers = helpers
         self.base_url = base_url
 
-    async def rust_banlist_export(self, organization_id:int, server_id:int = None) -> list[dict]:
+    async def rust_banlist_export(self, organization_id:int, server_id:int = None, to_file: str = None) -> list[dict]:
         """Exports your rust banlist.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-ban-/bans/export
         
         Args:
             organization_id (int): Organization ID the banlist belongs to
             server_id (int): Server ID the banlist is associated with.
+            to_file (str, optional): Stream the export into this file instead of loading it into memory. Read it with iter_export or parse_export. Defaults to None.
 
         Returns:
-            list[dict]: A list of dictionaries that provide the ban data.
+            list[dict]: A list of dictionaries that provide the ban data. The file path when to_file is given.
         """
         
         url = f"{self.base_url}/bans/export"
@@ -25,7 +26,22 @@ class BanList:
         if server_id:
             data["filter[server]"] = server_id
             
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        return await self.helpers._make_request(method="GET", url=url, params=data, to_file=to_file)
+
+    def iter_export(self, path: str):
+        """Reads a ban export saved with rust_banlist_export(to_file=...), one ban at a time, without downloading it again.
+        Args:
+            path (str): The saved export.
+        Yields:
+            dict: The ban data, same as rust_banlist_export returns.
+        """
+
+        return self.helpers._iter_ban_export_file(path)
+
+    def parse_export(self, path: str) -> list[dict]:
+        """Same as iter_export, but returns every ban as a list."""
+
+        return list(self.iter_export(path))
     
     async def create_invite(self, organization_id: int, banlist_id: str, permManage: bool, 
                             permCreate: bool, permUpdate: bool, permDelete: bool, uses: int = 1, limit: int = 1) -> dict:
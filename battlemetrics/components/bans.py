@@ -35,6 +35,8 @@ class Bans:
 
     async def update(self, banid: str, reason: str = None, note: str = None, append: bool = False) -> dict:
         """Updates a targeted ban
+        Every update to a ban goes through one queue per ban: updates made close together are merged into a single
+        read and write, applied in the order they were made, and never race each other.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-PATCH-ban-/bans/{(%23%2Fdefinitions%2Fban%2Fdefinitions%2Fidentity)}
         Args:
             banid (str): The target ban
@@ -45,16 +47,21 @@ class Bans:
             dict: The response from the server.
         """
 
+        return await self.helpers.coalescer.submit(("ban", str(banid)), (reason, note, append), lambda updates: self._write(banid, updates))
+
+    async def _write(self, banid: str, updates: list) -> dict:
         url = f"{self.base_url}/bans/{banid}"
         ban = await self.info(banid=banid)
-        if reason:
-            ban['data']['attributes']['reason'] = reason
-        if note:
-            if append:
-                ban['data']['attributes']['note'] += f"\n{note}"
-            else:
-                ban['data']['attributes']['note'] = note
-        return await self.helpers._make_request(method="PATCH", url=url, json=ban)
+        for reason, note, append in updates:
+            if reason:
+                ban['data']['attributes']['reason'] = reason
+            if note:
+                current = ban['data']['attributes'].get('note')
+                if append and current:
+                    ban['data']['attributes']['note'] = f"{current}\n{note}"
+                else:
+                    ban['data']['attributes']['note'] = note
+        return await self.helpers._make_request(method="PATCH", url=url, json_dict=ban)
 
     async def search(self, search: str = None, player_id: int = None, banlist: str = None, 
                      expired: bool = True, exempt: bool = False, server: int = None, organization_id: int = None, userIDs: str = None):
@@ -76,6 +83,28 @@ class Bans:
             dict: A dictionary response of all the bans for the given parameters.
         """
 
+        data = self._search_params(search=search, player_id=player_id, banlist=banlist, expired=expired, exempt=exempt,
+                                   server=server, organization_id=organization_id, userIDs=userIDs)
+        url = f"{self.base_url}/bans"
+
+        return await self.helpers._make_request(method="GET", url=url, params=data)
+
+    async def search_pages(self, search: str = None, player_id: int = None, banlist: str = None, expired: bool = True, exempt: bool = False,
+                           server: int = None, organization_id: int = None, userIDs: str = None, max_pages: int = None):
+        """Same as search, but follows the pages and yields each one as it arrives. Takes the same filters.
+        Args:
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all of them).
+        Yields:
+            dict: Each page of bans.
+        """
+
+        data = self._search_params(search=search, player_id=player_id, banlist=banlist, expired=expired, exempt=exempt,
+                                   server=server, organization_id=organization_id, userIDs=userIDs)
+        async for page in self.helpers._paginate(url=f"{self.base_url}/bans", params=data, max_pages=max_pages):
+            yield page
+
+    def _search_params(self, search: str = None, player_id: int = None, banlist: str = None, expired: bool = True, exempt: bool = False,
+                       server: int = None, organization_id: int = None, userIDs: str = None) -> dict:
         data = {
             "include": "server,user,player,organization",
             "filter[expired]": str(expired).lower(),
@@ -96,9 +125,7 @@ class Bans:
             data['filter[banList]'] = banlist
         if userIDs:
             data['filter[users]'] = userIDs
-        url = f"{self.base_url}/bans"
-
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        return data
     
     
     async def native_ban_info(self, server: int = None, ban: str = None) -> dict:
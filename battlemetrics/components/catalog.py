@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections.abc import Mapping
+
+from battlemetrics.components.gameinfo import GameInfo
+
+
+class Catalog:
+    """Local snapshot of the near static catalog: games, game features and feature options.
+    dump() writes it to one gzipped JSON file and load() reads it back in a single read, so a process can start
+    with the catalog in hand instead of asking the API. Lookups go through indexes built on load.
+    ensure() only fetches when there is no snapshot yet, a stale snapshot is used as is while a refresh runs in the background.
+    """
+
+    def __init__(self, gameinfo: GameInfo, path: str = None, max_age: float = 86400, concurrency: int = 4) -> None:
+        """
+        Args:
+            gameinfo (GameInfo): Where to fetch the catalog from.
+            path (str, optional): Snapshot file used by ensure() and refreshes. Defaults to None (memory only).
+            max_age (float, optional): Seconds before a snapshot counts as stale. Defaults to 86400 (a day).
+            concurrency (int, optional): How many feature option lookups may run at once. Defaults to 4.
+        """
+
+        self.gameinfo = gameinfo
+        self.path = path
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.fetched_at = None
+        self.games = {}
+        self.features = {}
+        self.options = {}
+        self._features_by_game = {}
+        self._feature_names = {}
+        self._option_names = {}
+        self._refresh_task = None
+        self._refresh_settings = {}
+
+    def _index(self) -> None:
+        self._features_by_game = {}
+        self._feature_names = {}
+        for feature_id, feature in self.features.items():
+            game_id = (((feature.get('relationships') or {}).get('game') or {}).get('data') or {}).get('id')
+            self._features_by_game.setdefault(game_id, []).append(feature_id)
+            name = self._name(feature)
+            if name:
+                self._feature_names[(game_id, name.lower())] = feature_id
+        self._option_names = {(feature_id, self._name(option).lower()): option
+                              for feature_id, options in self.options.items() for option in options if self._name(option)}
+
+    @staticmethod
+    def _name(resource: dict) -> str:
+        attributes = resource.get('attributes') or {}
+        return attributes.get('display') or attributes.get('name')
+
+    async def _all(self, url: str, params: dict) -> list:
+        resources = []
+        async for page in self.gameinfo.helpers._paginate(url=url, params=params):
+            if not isinstance(page, Mapping) or page.get('errors'):
+                raise Exception(f"Unable to fetch the catalog from {url}: {page}")
+            resources.extend(page.get('data') or [])
+        return resources
+
+    async def fetch(self, games: list = None, options: bool = True) -> "Catalog":
+        """Fetches the catalog from the API, replacing what is loaded.
+        Args:
+            games (list, optional): Only keep these game IDs, e.g. ["rust"]. Defaults to None (every game).
+            options (bool, optional): Also fetch the options of every feature. Defaults to True.
+        Returns:
+            Catalog: This catalog, for chaining.
+        """
+
+        base_url = self.gameinfo.base_url
+        game_list = await self._all(f"{base_url}/games", {"page[size]": "100"})
+        if games:
+            wanted = {str(game) for game in games}
+            game_list = [game for game in game_list if str(game.get('id')) in wanted]
+            feature_lists = await asyncio.gather(*(self._all(f"{base_url}/game-features", {"page[size]": "100", "filter[game]": game}) for game in games))
+        else:
+            feature_lists = [await self._all(f"{base_url}/game-features", {"page[size]": "100"})]
+        features = {feature['id']: feature for feature_list in feature_lists for feature in feature_list}
+
+        feature_options = {}
+        if options:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch_options(feature_id):
+                async with semaphore:
+                    feature_options[feature_id] = await self._all(f"{base_url}/game-features/{feature_id}/relationships/options",
+                                                                  {"page[size]": "100", "sort": "players"})
+
+            await asyncio.gather(*(fetch_options(feature_id) for feature_id in features))
+
+        self.games = {game['id']: game for game in game_list}
+        self.features = features
+        self.options = feature_options
+        self.fetched_at = time.time()
+        self._index()
+        return self
+
+    def dump(self, path: str = None) -> str:
+        """Writes the snapshot to a gzipped JSON file, atomically. Returns the path."""
+
+        path = path or self.path
+        snapshot = {"fetched_at": self.fetched_at, "games": self.games, "features": self.features, "options": self.options}
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(gzip.compress(json.dumps(snapshot, separators=(",", ":")).encode('utf-8')))
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    def load(self, path: str = None) -> "Catalog":
+        """Loads a snapshot written by dump() in one read and builds the indexes."""
+
+        with open(path or self.path, 'rb') as f:
+            snapshot = json.loads(gzip.decompress(f.read()))
+        self.fetched_at = snapshot.get('fetched_at')
+        self.games = snapshot.get('games') or {}
+        self.features = snapshot.get('features') or {}
+        self.options = snapshot.get('options') or {}
+        self._index()
+        return self
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at if self.fetched_at else float('inf')
+
+    @property
+    def stale(self) -> bool:
+        return self.age > self.max_age
+
+    async def ensure(self, games: list = None, options: bool = True) -> "Catalog":
+        """Makes the catalog usable as cheaply as possible: loads the snapshot file if there is one, and only waits
+        on the API when there is nothing at all. A stale snapshot is refreshed in the background.
+        Args:
+            games (list, optional): Passed to fetch(). Defaults to None.
+            options (bool, optional): Passed to fetch(). Defaults to True.
+        Returns:
+            Catalog: This catalog, for chaining.
+        """
+
+        self._refresh_settings = {"games": games, "options": options}
+        if self.fetched_at is None and self.path and os.path.exists(self.path):
+            self.load()
+        if self.fetched_at is None:
+            await self.refresh()
+        elif self.stale:
+            self.start_refresh(interval=None)
+        return self
+
+    async def refresh(self) -> "Catalog":
+        await self.fetch(**self._refresh_settings)
+        if self.path:
+            self.dump()
+        return self
+
+    def start_refresh(self, interval: float = None) -> asyncio.Task:
+        """Refreshes the catalog in a background task, then again every interval seconds if one is given.
+        The loaded data stays usable while a refresh runs, it is swapped in once the fetch completes.
+        """
+
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return self._refresh_task
+
+        async def run():
+            while True:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"Catalog refresh failed, keeping the snapshot from {self.age:.0f} seconds ago: {e}")
+                if not interval:
+                    return
+                await asyncio.sleep(interval)
+
+        self._refresh_task = asyncio.get_running_loop().create_task(run())
+        return self._refresh_task
+
+    def stop_refresh(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def game(self, game_id: str) -> dict:
+        return self.games.get(game_id)
+
+    def feature(self, feature_id: str) -> dict:
+        return self.features.get(feature_id)
+
+    def features_for(self, game_id: str) -> list:
+        """Every feature of a game."""
+
+        return [self.features[feature_id] for feature_id in self._features_by_game.get(game_id, [])]
+
+    def feature_id(self, game_id: str, name: str) -> str:
+        """Looks up a feature ID by its display name, case insensitive, e.g. feature_id("rust", "Gather Rate")."""
+
+        return self._feature_names.get((game_id, name.lower()))
+
+    def feature_options(self, feature_id: str) -> list:
+        return self.options.get(feature_id, [])
+
+    def option(self, feature_id: str, name: str) -> dict:
+        """Looks up a feature option by its display name, case insensitive."""
+
+        return self._option_names.get((feature_id, name.lower()))
@@ -0,0 +1,118 @@
+import re
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the endpoint's circuit is open."""
+
+    def __init__(self, endpoint: str, retry_in: float) -> None:
+        super().__init__(f"Circuit for {endpoint} is open, not sending the request. Next probe in {retry_in:.1f} seconds.")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def endpoint_template(method: str, url: str) -> str:
+    """Turns a request into its endpoint template, e.g. "POST /servers/{id}/command"."""
+
+    path = urlsplit(url).path
+    segments = ["{id}" if ID_SEGMENT.match(segment) else segment for segment in path.split("/")]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+class CircuitBreaker:
+    """Tracks the recent outcomes of one endpoint and stops sending to it while it is failing.
+    closed: requests flow, outcomes are recorded in a rolling window.
+    open: once the failure rate in the window reaches the threshold, requests fail fast until reset_timeout passes.
+    half_open: a few probe requests are let through. A success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, minimum_calls: int = 10, window: int = 20,
+                 reset_timeout: float = 30.0, half_open_max_calls: int = 1, on_state_change=None) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.half_open_in_flight = 0
+        self.total_calls = 0
+        self.total_failures = 0
+        self.rejected = 0
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        previous = self.state
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            print(f"Circuit for {self.name} opened after {self.failure_rate:.0%} failures.")
+        if state != HALF_OPEN:
+            self.half_open_in_flight = 0
+        if state == CLOSED:
+            self.outcomes.clear()
+        if self.on_state_change:
+            self.on_state_change(self.name, previous, state)
+
+    @property
+    def failure_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def allow(self) -> None:
+        """Call before sending. Raises CircuitOpenError if the request should not go out."""
+
+        if self.state == OPEN:
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, retry_in)
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.half_open_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 0.0)
+            self.half_open_in_flight += 1
+
+    def record(self, success: bool) -> None:
+        """Call with the outcome of a request that allow() let through."""
+
+        self.total_calls += 1
+        if not success:
+            self.total_failures += 1
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            self._set_state(CLOSED if success else OPEN)
+            return
+        self.outcomes.append(success)
+        if self.state == CLOSED and len(self.outcomes) >= self.minimum_calls and self.failure_rate >= self.failure_threshold:
+            self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Call instead of record() when a request that allow() let through was cancelled."""
+
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failure_rate": self.failure_rate,
+            "window_calls": len(self.outcomes),
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "rejected": self.rejected,
+            "retry_in": max(0.0, self.opened_at + self.reset_timeout - time.monotonic()) if self.state == OPEN else 0.0,
+        }
@@ -0,0 +1,57 @@
+import asyncio
+
+
+class WriteCoalescer:
+    """Write-behind queue that merges updates to the same resource.
+    Updates submitted for a key within `window` seconds of each other are handed to one flush together,
+    and flushes for the same key never overlap: while one runs, new updates collect for the next.
+    Everyone whose update went into a flush gets that flush's result (or exception).
+    """
+
+    def __init__(self, window: float = 0.25) -> None:
+        self.window = window
+        self._pending = {}
+        self._last_flush = {}
+        self.submitted = 0
+        self.flushes = 0
+
+    async def submit(self, key, value, flush):
+        """Queues value for key and waits for the flush it ends up in.
+        Args:
+            key (hashable): The resource, e.g. ("ban", "123").
+            value: One update. flush receives all of them, in submission order.
+            flush (coroutine function): Takes the list of values and writes them in one go.
+        Returns:
+            Whatever flush returned.
+        """
+
+        self.submitted += 1
+        batch = self._pending.get(key)
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = self._pending[key] = {"values": [], "future": loop.create_future()}
+            self._last_flush[key] = loop.create_task(self._run(key, batch, flush, self._last_flush.get(key)))
+        batch["values"].append(value)
+        # Shielded so that one caller giving up does not cancel the write for everyone else in the batch.
+        return await asyncio.shield(batch["future"])
+
+    async def _run(self, key, batch: dict, flush, previous) -> None:
+        try:
+            await asyncio.sleep(self.window)
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+        finally:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+        self.flushes += 1
+        try:
+            batch["future"].set_result(await flush(batch["values"]))
+        except Exception as e:
+            batch["future"].set_exception(e)
+            batch["future"].exception()
+        finally:
+            if self._last_flush.get(key) is asyncio.current_task():
+                del self._last_flush[key]
+
+    def stats(self) -> dict:
+        return {"submitted": self.submitted, "flushes": self.flushes, "pending": len(self._pending)}
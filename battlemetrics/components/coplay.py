@@ -0,0 +1,188 @@
+import asyncio
+import json
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+from battlemetrics.components.player import Player
+from battlemetrics.components.session import Session
+from battlemetrics.components.timeseries import parse_timestamp
+
+
+class CoplayGraph:
+    """Builds a graph of who played with whom by expanding Player.coplay_pages breadth first.
+    Every player is fetched at most once per graph and set of filters, however many times they are reached.
+    Edges are undirected and weighted by the coplay duration in seconds.
+    """
+
+    def __init__(self, player: Player, session: Session = None, concurrency: int = 5) -> None:
+        self.player = player
+        self.session = session
+        self.concurrency = concurrency
+        self.adjacency = {}
+        self.names = {}
+        self.depths = {}
+        self._fetched = {}
+        self._in_flight = {}
+
+    def add_edge(self, player_a, player_b, duration: int) -> None:
+        """Adds (or strengthens) the edge between two players. The longest reported duration wins."""
+
+        player_a, player_b = str(player_a), str(player_b)
+        if player_a == player_b:
+            return
+        duration = int(duration or 0)
+        for source, target in ((player_a, player_b), (player_b, player_a)):
+            neighbours = self.adjacency.setdefault(source, {})
+            if duration > neighbours.get(target, -1):
+                neighbours[target] = duration
+
+    async def _fetch(self, player_id: str, semaphore: asyncio.Semaphore, filters: dict) -> dict:
+        # Memoised per player and filters, an expand() over another time window or server must not reuse this one's data.
+        key = (player_id, json.dumps(filters, sort_keys=True, default=str))
+        if key in self._fetched:
+            return self._fetched[key]
+        if key in self._in_flight:
+            return await self._in_flight[key]
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            async with semaphore:
+                # Every page, so coplayers past the first 100 become edges and get expanded too.
+                response = {"data": []}
+                async for page in self.player.coplay_pages(player_id=player_id, **filters):
+                    if not isinstance(page, Mapping) or page.get('errors'):
+                        response = page
+                        break
+                    response['data'].extend(page.get('data') or [])
+            self._fetched[key] = response
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting it, mark it retrieved so asyncio doesn't warn.
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _add_coplay(self, player_id: str, response: dict) -> list:
+        coplayers = []
+        for relation in (response or {}).get('data') or []:
+            player_data = ((relation.get('relationships') or {}).get('player') or {}).get('data') or {}
+            coplayer = str(player_data.get('id') or relation.get('id'))
+            if coplayer == player_id:
+                # The player can show up in their own coplay list, there is no edge to follow.
+                continue
+            attributes = relation.get('attributes') or {}
+            if attributes.get('name'):
+                self.names[coplayer] = attributes['name']
+            self.add_edge(player_id, coplayer, attributes.get('duration'))
+            coplayers.append(coplayer)
+        return coplayers
+
+    async def expand(self, player_id, depth: int = 1, min_duration: int = 0, **filters) -> "CoplayGraph":
+        """Expands the graph outwards from a player.
+        Args:
+            player_id (int): Battlemetrics ID to start from.
+            depth (int, optional): How many hops to follow. 1 fetches just this player's coplayers. Defaults to 1.
+            min_duration (int, optional): Only follow edges of at least this many seconds. Defaults to 0.
+            **filters: Passed to Player.coplay_pages, e.g. time_start, time_end, server_names.
+        Returns:
+            CoplayGraph: This graph, for chaining.
+        """
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        frontier = [str(player_id)]
+        visited = {str(player_id)}
+        self.depths.setdefault(str(player_id), 0)
+        for level in range(depth):
+            # Already fetched nodes come straight from the memo, so only new players cost a request.
+            responses = await asyncio.gather(*(self._fetch(node, semaphore, filters) for node in frontier))
+            next_frontier = []
+            for node, response in zip(frontier, responses):
+                for coplayer in self._add_coplay(node, response):
+                    if self.adjacency[node][coplayer] < min_duration:
+                        continue
+                    if coplayer not in visited:
+                        visited.add(coplayer)
+                        self.depths.setdefault(coplayer, level + 1)
+                        next_frontier.append(coplayer)
+            frontier = next_frontier
+        return self
+
+    async def expand_session(self, session_id: str, player_id) -> "CoplayGraph":
+        """Adds edges from Session.coplay for one of the player's sessions.
+        The edge weight is the length of each coplaying session, which is an upper bound on the overlap.
+        Args:
+            session_id (str): The session to look up.
+            player_id (int): The battlemetrics ID the session belongs to.
+        Returns:
+            CoplayGraph: This graph, for chaining.
+        """
+
+        if not self.session:
+            raise Exception("CoplayGraph needs a Session component to expand sessions.")
+        response = await self.session.coplay(sessionid=session_id)
+        now = int(datetime.now(timezone.utc).timestamp())
+        for session in (response or {}).get('data') or []:
+            player_data = ((session.get('relationships') or {}).get('player') or {}).get('data') or {}
+            if not player_data.get('id'):
+                continue
+            attributes = session.get('attributes') or {}
+            if attributes.get('name'):
+                self.names[str(player_data['id'])] = attributes['name']
+            start = parse_timestamp(attributes['start']) if attributes.get('start') else now
+            stop = parse_timestamp(attributes['stop']) if attributes.get('stop') else now
+            self.add_edge(player_id, player_data['id'], max(0, stop - start))
+        return self
+
+    def neighbours(self, player_id) -> dict:
+        """Returns {coplayer: duration} for a player."""
+
+        return dict(self.adjacency.get(str(player_id), {}))
+
+    def strongest_links(self, player_id=None, limit: int = 10) -> list:
+        """Returns the longest coplay edges, either for one player or for the whole graph.
+        Returns:
+            list: (player_a, player_b, duration) tuples, longest first.
+        """
+
+        if player_id is not None:
+            player_id = str(player_id)
+            edges = [(player_id, other, duration) for other, duration in self.adjacency.get(player_id, {}).items()]
+        else:
+            edges = [(a, b, duration) for a, neighbours in self.adjacency.items() for b, duration in neighbours.items() if a < b]
+        edges.sort(key=lambda edge: edge[2], reverse=True)
+        return edges[:limit]
+
+    def shared_neighbours(self, player_a, player_b) -> dict:
+        """Returns the players both have played with, as {player: (duration with a, duration with b)}."""
+
+        neighbours_a = self.adjacency.get(str(player_a), {})
+        neighbours_b = self.adjacency.get(str(player_b), {})
+        return {player: (neighbours_a[player], neighbours_b[player]) for player in neighbours_a.keys() & neighbours_b.keys()}
+
+    def connected_components(self, min_duration: int = 0) -> list:
+        """Groups players connected by edges of at least min_duration seconds.
+        Returns:
+            list: Sets of player IDs, largest first.
+        """
+
+        seen = set()
+        components = []
+        for start in self.adjacency:
+            if start in seen:
+                continue
+            component = {start}
+            stack = [start]
+            seen.add(start)
+            while stack:
+                node = stack.pop()
+                for other, duration in self.adjacency[node].items():
+                    if duration >= min_duration and other not in seen:
+                        seen.add(other)
+                        component.add(other)
+                        stack.append(other)
+            components.append(component)
+        components.sort(key=len, reverse=True)
+        return components
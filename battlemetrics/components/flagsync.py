@@ -0,0 +1,103 @@
+import asyncio
+from collections.abc import Mapping
+
+from battlemetrics.components.player import Player
+
+
+class FlagReconciler:
+    """Makes the flags on BattleMetrics match a desired player -> flags mapping, touching only what differs.
+    Current state is read per flag with one paginated player search, so the reads scale with the number of
+    flagged players and the writes with the size of the diff, not with the number of players in the mapping.
+    Only the managed flags are ever added or removed, other flags on a profile are left alone.
+    """
+
+    def __init__(self, player: Player, concurrency: int = 5, organization_id: int = None) -> None:
+        self.player = player
+        self.concurrency = concurrency
+        self.organization_id = organization_id
+
+    async def current(self, flag_ids: set) -> dict:
+        """Returns flag ID -> set of player IDs that have it, for each of the flags."""
+
+        flag_ids = sorted(flag_ids)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(flag_id):
+            async with semaphore:
+                return await self.player.flagged_players(flag_id=flag_id, organization_id=self.organization_id)
+
+        return dict(zip(flag_ids, await asyncio.gather(*(fetch(flag_id) for flag_id in flag_ids))))
+
+    @staticmethod
+    def diff(desired: dict, current: dict, prune: bool = False) -> tuple:
+        """Works out the adds and deletes that turn current into desired.
+        Args:
+            desired (dict): Player ID -> flag IDs the player should have. Managed flags missing from a player's list are removed from them.
+            current (dict): Flag ID -> player IDs that have it, as returned by current().
+            prune (bool, optional): Also remove managed flags from players that are not in desired at all. Defaults to False.
+        Returns:
+            tuple: (adds, deletes), each a sorted list of (player_id, flag_id).
+        """
+
+        wanted = {}
+        for player_id, flag_ids in desired.items():
+            for flag_id in flag_ids:
+                wanted.setdefault(str(flag_id), set()).add(str(player_id))
+        listed = {str(player_id) for player_id in desired}
+        adds, deletes = [], []
+        for flag_id in set(wanted) | set(current):
+            should_have = wanted.get(flag_id, set())
+            has = current.get(flag_id, set())
+            adds.extend((player_id, flag_id) for player_id in should_have - has)
+            deletes.extend((player_id, flag_id) for player_id in has - should_have if prune or player_id in listed)
+        return sorted(adds), sorted(deletes)
+
+    async def reconcile(self, desired: dict, flags: list = None, prune: bool = False, dry_run: bool = False) -> dict:
+        """Reads the current state of the managed flags and applies the minimal set of changes.
+        Args:
+            desired (dict): Player ID -> list of flag IDs the player should have.
+            flags (list, optional): The managed flags. Defaults to every flag mentioned in desired. Pass it to also manage flags nobody should have.
+            prune (bool, optional): Also remove managed flags from players that are not in desired. Defaults to False.
+            dry_run (bool, optional): Only work out the changes, send nothing. Defaults to False.
+        Returns:
+            dict: Summary with the planned adds and deletes, how many were applied and any failures.
+        """
+
+        managed = {str(flag_id) for flag_id in flags or []}
+        for flag_ids in desired.values():
+            managed.update(str(flag_id) for flag_id in flag_ids)
+        desired = {str(player_id): {str(flag_id) for flag_id in flag_ids} & managed for player_id, flag_ids in desired.items()}
+        current = await self.current(managed)
+        adds, deletes = self.diff(desired, current, prune=prune)
+        summary = {
+            "dry_run": dry_run,
+            "flags": sorted(managed),
+            "players": len(desired),
+            "adds": adds,
+            "deletes": deletes,
+            "unchanged": sum(len(flag_ids) for flag_ids in desired.values()) - len(adds),
+            "applied": 0,
+            "failed": [],
+        }
+        if dry_run or not (adds or deletes):
+            return summary
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def apply(player_id, flag_id, add):
+            async with semaphore:
+                try:
+                    if add:
+                        response = await self.player.add_flag(player_id=player_id, flag_id=flag_id)
+                    else:
+                        response = await self.player.delete_flag(player_id=player_id, flag_id=flag_id)
+                except Exception as e:
+                    response = {"errors": [{"detail": str(e)}]}
+            if isinstance(response, Mapping) and response.get('errors'):
+                summary["failed"].append({"player_id": player_id, "flag_id": flag_id, "action": "add" if add else "delete", "errors": response['errors']})
+            else:
+                summary["applied"] += 1
+
+        await asyncio.gather(*[apply(player_id, flag_id, True) for player_id, flag_id in adds],
+                             *[apply(player_id, flag_id, False) for player_id, flag_id in deletes])
+        return summary
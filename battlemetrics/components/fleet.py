@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import random
+import time
+from collections.abc import Mapping
+
+from battlemetrics.components.server import Server
+
+DEFAULT_FIELDS = ("name", "players", "maxPlayers", "status", "rank", "details.map")
+
+
+class FleetMonitor:
+    """Watches many servers and yields only what changed.
+    Each server is polled on its own schedule with Server.info, without includes and with only the watched attributes,
+    so every poll is a small response and a handful of comparisons. A server that changed, or is close to full, is polled
+    again sooner and an idle one less often, so the number of requests follows how much is happening rather than fleet size.
+    Use it as `async for event in monitor.events(): ...`.
+    """
+
+    def __init__(self, server: Server, server_ids: list = None, fields: tuple = None, concurrency: int = 8,
+                 min_interval: float = 15, max_interval: float = 300, emit_initial: bool = False) -> None:
+        """
+        Args:
+            server (Server): Where to poll from.
+            server_ids (list, optional): Servers to watch, more can be added with add(). Defaults to None.
+            fields (tuple, optional): Attributes to watch, dotted for nested ones. Defaults to None (DEFAULT_FIELDS).
+            concurrency (int, optional): How many polls may run at once. Defaults to 8.
+            min_interval (float, optional): Shortest wait between two polls of a server, in seconds. Defaults to 15.
+            max_interval (float, optional): Longest wait between two polls of a server, in seconds. Defaults to 300.
+            emit_initial (bool, optional): Also yield the first values seen for each server. Defaults to False.
+        """
+
+        self.server = server
+        self.fields = tuple(fields or DEFAULT_FIELDS)
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.emit_initial = emit_initial
+        self.state = {}
+        self.intervals = {}
+        self.stats = {"polls": 0, "changes": 0, "errors": 0}
+        self._server_ids = set()
+        self._schedule = []
+        self._due = {}
+        self._wakeup = None
+        for server_id in server_ids or []:
+            self.add(server_id)
+
+    @property
+    def _attributes(self) -> list:
+        # The sparse fieldset works on top level attributes, "details.map" needs all of "details".
+        return list(dict.fromkeys(field.split(".")[0] for field in self.fields))
+
+    def add(self, server_id: int) -> None:
+        """Starts watching a server. Its first poll is spread over the next min_interval seconds."""
+
+        server_id = str(server_id)
+        if server_id in self._server_ids:
+            return
+        self._server_ids.add(server_id)
+        self.intervals[server_id] = self.min_interval
+        self._push(server_id, time.monotonic() + random.uniform(0, self.min_interval))
+
+    def remove(self, server_id: int) -> None:
+        """Stops watching a server. A poll already running for it is discarded."""
+
+        server_id = str(server_id)
+        self._server_ids.discard(server_id)
+        self.state.pop(server_id, None)
+        self.intervals.pop(server_id, None)
+        self._due.pop(server_id, None)
+
+    def _push(self, server_id: str, due: float) -> None:
+        # Only the latest entry of a server counts, older ones left in the heap (e.g. after remove() and add()) are skipped.
+        self._due[server_id] = due
+        heapq.heappush(self._schedule, (due, server_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _values(self, response: dict) -> dict:
+        attributes = (response.get('data') or {}).get('attributes') or {}
+        values = {}
+        for field in self.fields:
+            value = attributes
+            for key in field.split("."):
+                value = value.get(key) if isinstance(value, dict) else None
+            values[field] = value
+        return values
+
+    def _next_interval(self, server_id: str, values: dict, changed: bool) -> float:
+        interval = self.intervals.get(server_id, self.min_interval)
+        interval = interval / 2 if changed else interval * 1.5
+        players = values.get('players') or 0
+        max_players = values.get('maxPlayers') or 0
+        if players and max_players:
+            # The fuller a server, the more often its numbers move: cap the wait accordingly.
+            interval = min(interval, self.max_interval * (1 - min(players / max_players, 1)))
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    async def poll(self, server_id: int) -> dict:
+        """Polls one server now and returns its change event, or None if nothing changed."""
+
+        server_id = str(server_id)
+        self.stats['polls'] += 1
+        try:
+            response = await self.server.info(server_id, include="", fields=self._attributes)
+        except Exception as e:
+            response = {"errors": [{"detail": str(e) or type(e).__name__}]}
+        if server_id not in self._server_ids:
+            return None
+        if not isinstance(response, Mapping) or response.get('errors') or not response.get('data'):
+            self.stats['errors'] += 1
+            print(f"Unable to poll server {server_id}, backing off: {response}")
+            self.intervals[server_id] = min(self.max_interval, self.intervals.get(server_id, self.min_interval) * 2)
+            return None
+
+        values = self._values(response)
+        previous = self.state.get(server_id)
+        self.state[server_id] = values
+        if previous is None:
+            changes = {field: [None, value] for field, value in values.items()} if self.emit_initial else {}
+        else:
+            changes = {field: [previous.get(field), value] for field, value in values.items() if previous.get(field) != value}
+        self.intervals[server_id] = self._next_interval(server_id, values, changed=previous is not None and bool(changes))
+        if not changes:
+            return None
+        self.stats['changes'] += 1
+        return {"server_id": server_id, "changes": changes, "initial": previous is None, "timestamp": time.time()}
+
+    async def events(self):
+        """Polls the watched servers until the iterator is closed, yielding a change event whenever one changes.
+        Yields:
+            dict: {"server_id", "changes": {field: [old, new]}, "initial", "timestamp"}
+        """
+
+        queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        runner = asyncio.get_running_loop().create_task(self._run(queue))
+        try:
+            while True:
+                event = await queue.get()
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            self._wakeup = None
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        polls = set()
+
+        async def run(server_id):
+            async with semaphore:
+                event = await self.poll(server_id)
+            if event is not None:
+                queue.put_nowait(event)
+            if server_id in self._server_ids:
+                self._push(server_id, time.monotonic() + self.intervals[server_id])
+
+        try:
+            while True:
+                now = time.monotonic()
+                while self._schedule and self._schedule[0][0] <= now:
+                    due, server_id = heapq.heappop(self._schedule)
+                    if self._due.get(server_id) == due:
+                        task = asyncio.get_running_loop().create_task(run(server_id))
+                        polls.add(task)
+                        task.add_done_callback(polls.discard)
+                self._wakeup.clear()
+                delay = self._schedule[0][0] - now if self._schedule else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            for task in polls:
+                task.cancel()
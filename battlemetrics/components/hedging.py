@@ -0,0 +1,78 @@
+from collections import deque
+
+
+class HedgePolicy:
+    """Settings and bookkeeping for hedged GET requests.
+    If a GET has not answered within the endpoint's recent latency percentile, a second identical request is sent
+    and whichever answers first wins. Hedges are paid for out of a budget that grows by `budget` per request,
+    so at most that fraction of requests (5% by default) ever gets a duplicate.
+    """
+
+    def __init__(self, percentile: float = 95, default_delay: float = 0.5, min_delay: float = 0.05, max_delay: float = 5.0,
+                 budget: float = 0.05, max_saved: float = 10, window: int = 200, min_samples: int = 20) -> None:
+        """
+        Args:
+            percentile (float, optional): Latency percentile of the endpoint to wait before hedging. Defaults to 95.
+            default_delay (float, optional): Seconds to wait before hedging until enough latencies have been seen. Defaults to 0.5.
+            min_delay (float, optional): Never hedge sooner than this. Defaults to 0.05.
+            max_delay (float, optional): Never wait longer than this to hedge. Defaults to 5.0.
+            budget (float, optional): Hedges allowed per request, 0.05 means 5% extra load at most. Defaults to 0.05.
+            max_saved (float, optional): Cap on unused budget so a quiet period can't fund a burst of hedges. Defaults to 10.
+            window (int, optional): Latencies kept per endpoint. Defaults to 200.
+            min_samples (int, optional): Latencies needed before the percentile is trusted. Defaults to 20.
+        """
+
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.max_saved = max_saved
+        self.window = window
+        self.min_samples = min_samples
+        self.latencies = {}
+        self.allowance = 1.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self, endpoint: str) -> float:
+        """Seconds to wait for the first request before hedging."""
+
+        samples = self.latencies.get(endpoint)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return min(self.max_delay, max(self.min_delay, ordered[index]))
+
+    def record(self, endpoint: str, latency: float) -> None:
+        samples = self.latencies.get(endpoint)
+        if samples is None:
+            samples = self.latencies[endpoint] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def on_request(self) -> None:
+        self.requests += 1
+        self.allowance = min(self.max_saved, self.allowance + self.budget)
+
+    def try_hedge(self, limiter=None) -> bool:
+        """Spends one hedge from the budget, and a rate limiter token if one is free right now.
+        Returns False if either is missing, a hedge never queues behind other requests for the limiter.
+        """
+
+        if self.allowance < 1:
+            return False
+        if limiter is not None and not limiter.try_reserve():
+            return False
+        self.allowance -= 1
+        self.hedges += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "delays": {endpoint: self.delay(endpoint) for endpoint in self.latencies},
+        }
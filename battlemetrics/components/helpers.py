@@ -1,110 +1,381 @@
 from datetime import timedelta, datetime
 import json
+import mmap
+import os
+from collections.abc import Mapping
 from time import strftime, localtime
 
-import aiohttp
 import re
 import asyncio
 
+from battlemetrics.components.circuitbreaker import CircuitBreaker, endpoint_template
+from battlemetrics.components.coalesce import WriteCoalescer
+from battlemetrics.components.hedging import HedgePolicy
+from battlemetrics.components.identity import IdentityMap
+from battlemetrics.components.ratelimit import RateLimiter
+from battlemetrics.components.responses import RESPONSE_MODE, RESPONSE_MODES, LazyDocument, RawResponse, is_json_object
+from battlemetrics.components.retry import RetryPolicy
+from battlemetrics.components.tokenpool import TokenPool
+from battlemetrics.components.transport import Transport
+
+BAN_EXPORT_PATTERN = re.compile(r"""
+        ^\s*banid[ ]              # Appears to be a literal, skip this
+        (?P<steamid>\d+)[ ]         # that banID number
+        "(?P<name>.*?)"[ ]        # whodunnit
+        "(?P<reason>.*?)"[ ]      # what they did
+        (?P<duration>-?\d*)\s*$   # the duration of the ban
+    """, re.VERBOSE)
+
 class Helpers:
 
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, limiter: RateLimiter = None, token_pool: TokenPool = None, retry_policy: RetryPolicy = None,
+                 circuit_breakers: bool = True, circuit_breaker_settings: dict = None, hedge_policy: HedgePolicy = None,
+                 coalesce_window: float = 0.25, identity_map: IdentityMap = None, transport: Transport = None) -> None:
         self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.coalescer = WriteCoalescer(window=coalesce_window)
+        self.session = None
+        self.identity_map = identity_map
+        self.transport = transport
+        self.hedge_policy = hedge_policy
+        self.limiter = limiter
+        self.token_pool = token_pool
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breakers = circuit_breakers
+        self.circuit_breaker_settings = circuit_breaker_settings or {}
+        self.breakers = {}
+
+    async def open_session(self, connection_limit: int = 100) -> None:
+        """Opens one aiohttp session that every request reuses, keeping connections alive between requests.
+        Without it each request opens and closes its own session. Close it with close() before the event loop ends.
+        Args:
+            connection_limit (int, optional): Connections the session may hold open at once. Defaults to 100.
+        """
+
+        import aiohttp
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connection_limit))
 
-    async def _make_request(self, method: str, url: str, params: dict = None, json_dict:dict= None) -> dict:
+    async def close(self) -> None:
+        if self.transport is not None and self.transport.mode == "record":
+            self.transport.save()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _breaker(self, method: str, url: str) -> CircuitBreaker:
+        if not self.circuit_breakers:
+            return None
+        template = endpoint_template(method, url)
+        breaker = self.breakers.get(template)
+        if breaker is None:
+            breaker = self.breakers[template] = CircuitBreaker(name=template, **self.circuit_breaker_settings)
+        return breaker
+
+    def breaker_stats(self) -> dict:
+        """Returns the circuit breaker state of every endpoint used so far, keyed by endpoint template."""
+
+        return {template: breaker.stats() for template, breaker in self.breakers.items()}
+
+    async def _make_request(self, method: str, url: str, params: dict = None, json_dict:dict= None, idempotent: bool = False, to_file: str = None,
+                            response_mode: str = None) -> dict:
         """Queries the API and spits out the response.
         Args:
             method (str): One of: GET, POST, PATCH, DELETE
             url (str): The endpoint/url you wish to query.
             params (dict, optional): Any params you wish to send to enhance your experience?. Defaults to None.
             json (dict, optional): json data you wish to send to enhance your experience?. Defaults to None.
+            idempotent (bool, optional): Mark a POST as safe to retry, e.g. a search. Defaults to False.
+            to_file (str, optional): Stream a successful response body straight into this file instead of decoding it. Defaults to None.
+            response_mode (str, optional): "decoded", "raw" for a RawResponse or "lazy" for a LazyDocument. Defaults to the mode set with Battlemetrics.response_mode, normally "decoded".
         Raises:
             Exception: Doom and gloom.
         Returns:
-            dict: The response from the server.
+            dict: The response from the server, or the path of the file when to_file is given and the request succeeded.
         """
 
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            async with session.request(method=method, url=url, json=json_dict, params=params) as r:
-            
-                content_type = r.headers.get('content-type', '')
-                response_status = int(r.status)
-                
-                if response_status >= 400:
-                    if response_status == 429:
-                        print("You're being rate limited. Waiting 30 seconds and trying again.")
-                        await asyncio.sleep(30)
-                        return await self._make_request(method=method, url=url,params=params, json_dict=json_dict)
-                    else:
-                        try:
-                            response = await r.json()
-                            if response.get('errors'):
-                                print(json.dumps(response, indent=4))
-                            return response
-                        except Exception as e:
-                            print(e)
-                            response = await r.text()
-                            with open('errors.txt', 'w') as f:
-                                f.write(response)
-                
-                if 'json' in content_type:
-                    try:
-                        response = await r.json()
-                    except Exception as e:
-                        print(f"There's an issue with the respon json data.. Going to try and fix!\n<<Exception@Json>>\n{e}\n")
-                        try:
-                            stream = await r.content.read()
-                            if len(stream) < 10:
-                                stream = await r.text()
-                            try:
-                                response = json.loads(stream)
-                                return response
-                            except Exception as e:
-                                print(f"Tried turning a text to dict.. Failed..\n{e}")
-                                response = await self._exception_handler(stream)
-                        except Exception as e:
-                            print(f"Even the exception handler can't handle this nonsene!\n{e}")
-                            
-                elif 'octet-stream' in content_type:
-                    stream = await r.text(encoding='utf-8')
-                    pattern = re.compile(r"""
-                            ^\s*banid[ ]              # Appears to be a literal, skip this
-                            (?P<steamid>\d+)[ ]         # that banID number
-                            "(?P<name>.*?)"[ ]        # whodunnit
-                            "(?P<reason>.*?)"[ ]      # what they did
-                            (?P<duration>-?\d*)\s*$   # the duration of the ban
-                        """, re.VERBOSE)
-                    data = []
-                    for line in stream.splitlines():
-                        if line.strip() == "":
-                            continue
-                        if contents := pattern.match(line):
-                            contents = contents.groupdict()
-                            if contents['duration'] == "-1":
-                                contents['duration'] = "Permanent"
-                            else:
-                                duration = int(contents['duration'])
-                                try:
-                                    duration = strftime(
-                                        '%Y-%m-%d %H:%M:%S', localtime(duration))
-                                    print(duration)
-                                except Exception as e:
-                                    print(f"Failed to convert duration to time, defaulted to 'The future'\nSteam ID: {contents['steamid']}\nDuration: {duration}\nError: {e}")
-                                    duration = "The future"
-                                contents['duration'] = duration
-                            data.append(contents)
-                        else:
-                            print(f"Voodoo Failed. VOODOOO FAILED! PANIC!!\n{line}")
-                    return data
-                
-                elif 'text/html' in content_type:
-                    response = await r.text()
-                    response = response.replace("'", "").replace("b", "")
+        response_mode = response_mode or RESPONSE_MODE.get()
+        if response_mode not in RESPONSE_MODES:
+            raise ValueError(f"response_mode must be one of {', '.join(RESPONSE_MODES)}.")
+
+        return await self._send_request(method=method, url=url, params=params, json_dict=json_dict, idempotent=idempotent, to_file=to_file,
+                                        response_mode=response_mode)
+
+    def _route(self, method: str, url: str, params: dict, json_dict: dict) -> tuple:
+        """Picks the token for one attempt. Returns (headers, limiter, pooled token or None)."""
+
+        # Replayed responses never reach the API, so they don't count against its rate limit.
+        replaying = self.transport is not None and self.transport.mode == "replay"
+        if not self.token_pool:
+            return self.headers, None if replaying else self.limiter, None
+        token = self.token_pool.for_request(method=method, url=url, json_dict=json_dict, params=params)
+        return token.headers, None if replaying else token.limiter, token
+
+    async def _send_request(self, method: str, url: str, params: dict, json_dict: dict, idempotent: bool = False, to_file: str = None,
+                            response_mode: str = "decoded") -> dict:
+        policy = self.retry_policy
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.deadline if policy.deadline else None
+        retryable = policy.can_retry(method, idempotent)
+        breaker = self._breaker(method, url)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - loop.time() if deadline else None
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError(f"{method} {url} ran out of time after {attempt - 1} attempt(s).")
+            # Routed again on every attempt, so a retry after a 429 can go out on another pooled token.
+            headers, limiter, token = self._route(method, url, params, json_dict)
+            if breaker:
+                breaker.allow()
+            if token:
+                token.in_flight += 1
+                token.requests += 1
+            try:
+                if self.hedge_policy and method.upper() == "GET" and not to_file:
+                    send = self._send_hedged(method=method, url=url, params=params, headers=headers, limiter=limiter)
                 else:
-                    raise Exception(f"Unsupported Content Type: {content_type}\n Some additional stuff: {r}\nresponse_status: {response_status}")
-                await session.close()
+                    send = self._send_once(method=method, url=url, params=params, json_dict=json_dict, headers=headers, limiter=limiter, to_file=to_file)
+                status, response_headers, body = await asyncio.wait_for(send, timeout=remaining)
+            except asyncio.CancelledError:
+                if breaker:
+                    breaker.release()
+                raise
+            except policy.exceptions as e:
+                if breaker:
+                    breaker.record(False)
+                if not retryable or attempt >= policy.max_attempts:
+                    raise
+                wait = policy.backoff(attempt)
+                if deadline and loop.time() + wait >= deadline:
+                    raise
+                print(f"{method} {url} failed ({e!r}), retrying in {wait:.2f} seconds.")
+                await asyncio.sleep(wait)
+                continue
+            except Exception:
+                if breaker:
+                    breaker.record(False)
+                raise
+            finally:
+                if token:
+                    token.in_flight -= 1
+
+            if breaker:
+                # Rate limiting says nothing about the endpoint's health, server errors do.
+                breaker.record(status < 500)
+            if status == 429:
+                # Nothing was done, so even a non idempotent request can go again, within max_attempts and the deadline.
+                wait = float(response_headers.get('retry-after') or 30)
+                if attempt < policy.max_attempts and (not deadline or loop.time() + wait < deadline):
+                    print(f"You're being rate limited. Waiting {wait:g} seconds and trying again.")
+                    if limiter:
+                        limiter.penalize(wait)
+                    await asyncio.sleep(wait)
+                    continue
+            elif status in policy.statuses and retryable and attempt < policy.max_attempts:
+                wait = policy.backoff(attempt)
+                if not deadline or loop.time() + wait < deadline:
+                    print(f"{method} {url} returned {status}, retrying in {wait:.2f} seconds.")
+                    await asyncio.sleep(wait)
+                    continue
+            if body is None:
+                return to_file
+            if response_mode == "raw":
+                return RawResponse(status=status, headers=response_headers, body=body)
+            # Only objects can be read lazily, a list or scalar body is decoded as usual.
+            if response_mode == "lazy" and status < 400 and 'json' in response_headers.get('content-type', '') and is_json_object(body):
+                return LazyDocument(body)
+            response = await self._decode_response(status=status, content_type=response_headers.get('content-type', ''), body=body)
+            if self.identity_map is not None and isinstance(response, dict):
+                self.identity_map.intern(response)
+            return response
+
+    async def _send_once(self, method: str, url: str, params: dict, json_dict: dict, headers: dict, limiter: RateLimiter, to_file: str = None) -> tuple:
+        """Makes a single HTTP request and reads the whole body.
+        Returns:
+            tuple: (status, headers with lower case names, body bytes). The body is None when it was streamed into to_file.
+        """
+
+        if limiter:
+            await limiter.acquire()
+
+        if self.transport is not None:
+            return await self.transport.send(self._send_http, method=method, url=url, params=params, json_dict=json_dict, headers=headers, to_file=to_file)
+        return await self._send_http(method=method, url=url, params=params, json_dict=json_dict, headers=headers, to_file=to_file)
+
+    async def _send_http(self, method: str, url: str, params: dict, json_dict: dict, headers: dict, to_file: str = None) -> tuple:
+        if self.session is not None and not self.session.closed:
+            async with self.session.request(method=method, url=url, json=json_dict, params=params, headers=headers, timeout=self.retry_policy.timeout()) as r:
+                return await self._read_response(r, to_file)
+
+        # Imported here rather than at the top, aiohttp is by far the slowest part of importing this package.
+        import aiohttp
+        async with aiohttp.ClientSession(headers=headers, timeout=self.retry_policy.timeout()) as session:
+            async with session.request(method=method, url=url, json=json_dict, params=params) as r:
+                return await self._read_response(r, to_file)
+
+    async def _read_response(self, r, to_file: str = None) -> tuple:
+        response_headers = {key.lower(): value for key, value in r.headers.items()}
+        if to_file and r.status < 300:
+            await self._stream_to_file(r, to_file)
+            return int(r.status), response_headers, None
+        body = await r.read()
+        return int(r.status), response_headers, body
+
+    async def _stream_to_file(self, response, path: str, chunk_size: int = 1 << 16) -> None:
+        # Written next to the target and renamed at the end, so an interrupted download never leaves a truncated file behind.
+        partial = f"{path}.part"
+        try:
+            with open(partial, 'wb') as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    async def _send_hedged(self, method: str, url: str, params: dict, headers: dict, limiter: RateLimiter) -> tuple:
+        """Sends a GET and, if it is slower than usual for the endpoint, a duplicate. The first good answer wins and the other is cancelled."""
+
+        policy = self.hedge_policy
+        endpoint = endpoint_template(method, url)
+        loop = asyncio.get_running_loop()
+        # Time spent queued for the limiter is not endpoint latency: the clock starts once the request goes out.
+        if limiter:
+            await limiter.acquire()
+        started = loop.time()
+        policy.on_request()
+        tasks = [asyncio.ensure_future(self._send_once(method=method, url=url, params=params, json_dict=None, headers=headers, limiter=None))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=policy.delay(endpoint))
+            if not done and policy.try_hedge(limiter):
+                tasks.append(asyncio.ensure_future(self._send_once(method=method, url=url, params=params, json_dict=None, headers=headers, limiter=None)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        policy.record(endpoint, loop.time() - started)
+                        if task is not tasks[0]:
+                            policy.hedge_wins += 1
+                        return task.result()
+            # Every attempt failed, surface the original request's error.
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _decode_response(self, status: int, content_type: str, body: bytes):
+        """Turns a response body into what the endpoint methods return, based on its content type."""
+
+        if status >= 400:
+            try:
+                response = json.loads(body)
+                if response.get('errors'):
+                    print(json.dumps(response, indent=4))
+                return response
+            except Exception as e:
+                print(e)
+                with open('errors.txt', 'w') as f:
+                    f.write(body.decode('utf-8', errors='replace'))
+
+        if status == 204 or not body:
+            # Deletes answer with 204 No Content, there is nothing to decode.
+            return {}
+
+        if 'json' in content_type:
+            try:
+                response = json.loads(body)
+            except Exception as e:
+                print(f"There's an issue with the respon json data.. Going to try and fix!\n<<Exception@Json>>\n{e}\n")
+                try:
+                    response = await self._exception_handler(body)
+                except Exception as e:
+                    print(f"Even the exception handler can't handle this nonsene!\n{e}")
+                    response = None
+
+        elif 'octet-stream' in content_type:
+            return self._parse_ban_export(body.decode('utf-8'))
+
+        elif 'text/html' in content_type:
+            response = body.decode('utf-8', errors='replace')
+            response = response.replace("'", "").replace("b", "")
+        else:
+            raise Exception(f"Unsupported Content Type: {content_type}\nresponse_status: {status}")
         return response
 
+    def _parse_ban_export(self, stream: str) -> list:
+        data = []
+        for line in stream.splitlines():
+            if line.strip() == "":
+                continue
+            if contents := BAN_EXPORT_PATTERN.match(line):
+                data.append(self._ban_export_entry(contents.groupdict()))
+            else:
+                print(f"Voodoo Failed. VOODOOO FAILED! PANIC!!\n{line}")
+        return data
+
+    def _iter_ban_export_file(self, path: str):
+        """Parses a ban export saved on disk one line at a time through mmap, so memory use does not grow with the file.
+        Args:
+            path (str): The saved export.
+        Yields:
+            dict: Each ban, in the same form _parse_ban_export returns.
+        """
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                position = 0
+                size = len(mm)
+                while position < size:
+                    end = mm.find(b"\n", position)
+                    if end == -1:
+                        end = size
+                    line = mm[position:end].decode('utf-8', errors='replace')
+                    position = end + 1
+                    if line.strip() == "":
+                        continue
+                    if contents := BAN_EXPORT_PATTERN.match(line):
+                        yield self._ban_export_entry(contents.groupdict())
+                    else:
+                        print(f"Voodoo Failed. VOODOOO FAILED! PANIC!!\n{line}")
+
+    def _ban_export_entry(self, contents: dict) -> dict:
+        if contents['duration'] == "-1":
+            contents['duration'] = "Permanent"
+        else:
+            duration = contents['duration']
+            try:
+                duration = strftime('%Y-%m-%d %H:%M:%S', localtime(int(duration)))
+            except Exception as e:
+                print(f"Failed to convert duration to time, defaulted to 'The future'\nSteam ID: {contents['steamid']}\nDuration: {duration}\nError: {e}")
+                duration = "The future"
+            contents['duration'] = duration
+        return contents
+
+    async def _paginate(self, url: str, params: dict = None, max_pages: int = None):
+        """Follows the "next" links of a paginated response, yielding one page at a time.
+        Args:
+            url (str): The endpoint/url you wish to query.
+            params (dict, optional): Params for the first page. The next links already carry them. Defaults to None.
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all of them).
+        Yields:
+            dict: Each page of the response.
+        """
+
+        pages = 0
+        while url:
+            response = await self._make_request(method="GET", url=url, params=params)
+            yield response
+            pages += 1
+            if not isinstance(response, Mapping) or (max_pages and pages >= max_pages):
+                return
+            url = (response.get('links') or {}).get('next')
+            params = None
+
     #This function attempts to find and fix any errors in the JSON response.
     async def _exception_handler(self, response_content) -> dict:
         print("Exception Handler Running...Attempting to fix the response.")
@@ -0,0 +1,64 @@
+import weakref
+
+
+class Resource(dict):
+    """A JSON:API resource shared through an IdentityMap. Behaves exactly like the plain dict it replaces,
+    but can be weakly referenced so the map never keeps a resource alive on its own.
+    """
+
+
+class IdentityMap:
+    """Keeps one object per (type, id) across the included resources of every response the client decodes.
+    The same server or organization included on thousands of pages then costs one dict instead of thousands.
+    Resources are held by weak reference and dropped once no response refers to them any more.
+    When a resource shows up again its attributes, relationships and meta are merged into the existing object,
+    so the shared copy always has the newest values and keeps fields a sparse response left out.
+    This means responses alias each other: an included resource held from one response changes when a later response
+    includes it, and editing it in place edits it for every response. Copy it first to change it. A response's data
+    is left alone, it is what callers edit and send back, e.g. when updating a ban.
+    """
+
+    def __init__(self) -> None:
+        self._resources = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, resource_type: str, resource_id: str) -> Resource:
+        return self._resources.get((resource_type, str(resource_id)))
+
+    def resource(self, resource: dict) -> dict:
+        """Returns the shared object for a resource, merging the resource into it."""
+
+        if not isinstance(resource, dict) or resource.get('type') is None or resource.get('id') is None:
+            return resource
+        key = (resource['type'], str(resource['id']))
+        existing = self._resources.get(key)
+        if existing is None:
+            self.misses += 1
+            existing = self._resources[key] = Resource(resource)
+            return existing
+        self.hits += 1
+        if existing is not resource:
+            for section in ('attributes', 'relationships', 'meta'):
+                if isinstance(resource.get(section), dict):
+                    if isinstance(existing.get(section), dict):
+                        existing[section].update(resource[section])
+                    else:
+                        existing[section] = dict(resource[section])
+            for name, value in resource.items():
+                if name not in ('attributes', 'relationships', 'meta'):
+                    existing[name] = value
+        return existing
+
+    def intern(self, document: dict) -> dict:
+        """Swaps the resources in a response's included for their shared objects, in place."""
+
+        if isinstance(document.get('included'), list):
+            document['included'] = [self.resource(item) for item in document['included']]
+        return document
+
+    def __len__(self) -> int:
+        return len(self._resources)
+
+    def stats(self) -> dict:
+        return {"resources": len(self._resources), "hits": self.hits, "misses": self.misses}
@@ -43,26 +43,42 @@ class Notes:
 
     async def update(self, player_id: int, note_id: str, note: str, shared: bool, append: bool = False) -> dict:
         """Update an existing note.
+        Every update to a note goes through one queue per note: updates made close together are merged into a single
+        write, applied in the order they were made, and never race each other.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-PATCH-playerNote-/players/{(%23%2Fdefinitions%2Fplayer%2Fdefinitions%2Fidentity)}/relationships/notes/{(%23%2Fdefinitions%2FplayerNote%2Fdefinitions%2Fidentity)}
         Args:
             player_id (int): The battlemetrics ID of the user.
             note_id (str): The ID of the note.
             note (str): The new note.
             shared (bool): Shared?
+            append (bool, optional): Add the note as a new line of the existing one. Defaults to False.
         Returns:
             dict: Response from server.
         """
 
+        return await self.helpers.coalescer.submit(("note", str(note_id)), (note, shared, append), lambda updates: self._apply(player_id, note_id, updates))
+
+    async def _apply(self, player_id: int, note_id: str, updates: list) -> dict:
+        text = None
+        for note, _, append in updates:
+            if not append:
+                text = note
+                continue
+            if text is None:
+                # Only read the note when an append comes before any replacement.
+                existingnote = await self.info(player_id=player_id, note_id=note_id)
+                text = (existingnote['data']['attributes'].get('note') if existingnote else None) or ""
+            # No separator in front of the first line of an empty note.
+            text = f"{text}\n{note}" if text else note
+        # The most recent caller decides whether the note is shared.
+        return await self._write(player_id, note_id, text, updates[-1][1])
+
+    async def _write(self, player_id: int, note_id: str, note: str, shared: bool) -> dict:
         url = f"{self.base_url}/players/{player_id}/relationships/notes/{note_id}"
-        if append:
-            existingnote = await self.info(player_id=player_id, note_id=note_id)
-            if existingnote:
-                existingnote = existingnote['data']['attributes']['note']
-            note = f"{existingnote}\n{note}"
         data = {
             "data": {
                 "type": "playerNote",
-                "id": "example",
+                "id": f"{note_id}",
                 "attributes": {
                     "note": f"{note}",
                     "shared": f"{str(shared).lower()}"
@@ -1,7 +1,11 @@
+import asyncio
 import datetime
+import time
 import uuid
+from collections.abc import Mapping
 
 from datetime import datetime, timedelta
+from battlemetrics.components.banlist import BanList
 from battlemetrics.components.helpers import Helpers
 
 class Organization:
@@ -171,7 +175,7 @@ class Organization:
         url = f"{self.base_url}/organizations/{organization_id}/relationships/friends/{friends_id}"
         return await self.helpers._make_request(method="DELETE", url=url)
 
-    async def player_stats(self, organization_id: int, start_date: str = None, end_date: str = None, game:str = None) -> dict:
+    async def player_stats(self, organization_id: int, start_date: str = None, end_date: str = None, game:str = None, as_series: bool = False, group: str = None, metric: str = None) -> dict:
         """Returns the statistics of all the players who have joined your server and where they're from.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-organization-/organizations/{(%23%2Fdefinitions%2Forganization%2Fdefinitions%2Fidentity)}/stats/players
         Args:
@@ -179,8 +183,11 @@ class Organization:
             start_date (str, optional): Start date, max 90 days. Defaults to 90 days ago.
             end_date (str, optional): End date, defaults to now.
             game (str, optional): The game you wish to filter by. Defaults to None
+            as_series (bool, optional): Return a compact TimeSeries instead of the raw response. Defaults to False.
+            group (str, optional): With as_series, only keep datapoints in this group. Defaults to None.
+            metric (str, optional): With as_series, only keep datapoints of this metric. Needed when the response holds several. Defaults to None.
         Returns:
-            dict: Returns a dictionary of all the stats!
+            dict: Returns a dictionary of all the stats! Or a TimeSeries if as_series is set.
         """
 
         url = f"{self.base_url}/organizations/{organization_id}/stats/players"
@@ -198,7 +205,11 @@ class Organization:
         if game:
             data["filter[game]"] = game
         
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        response = await self.helpers._make_request(method="GET", url=url, params=data)
+        if as_series:
+            from battlemetrics.components.timeseries import TimeSeries
+            return TimeSeries.from_response(response, name=metric or "player_stats", metric=metric, group=group)
+        return response
 
     async def commands_activity(self, organization_id: int, summary: bool = False, users: str = None, commands: str = None, time_start: str = None, time_end: str = None, servers: int = None) -> dict:
         """Grabs all the command activity related to the targeted organization
@@ -262,10 +273,142 @@ class Organization:
         """
         
         url = f"{self.base_url}/audit-log"
-        data = {
+        data = self._auditlog_params(organization_id)
+        return await self.helpers._make_request(method="GET", url=url, params=data)
+
+    async def auditlog_pages(self, organization_id: int, max_pages: int = None):
+        """Follows the pages of an organization's audit log, newest first, yielding each one as it arrives.
+        Args:
+            organization_id (int): The organization ID
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all of them).
+        Yields:
+            dict: Each page of audit log entries.
+        """
+
+        url = f"{self.base_url}/audit-log"
+        async for page in self.helpers._paginate(url=url, params=self._auditlog_params(organization_id), max_pages=max_pages):
+            yield page
+
+    def _auditlog_params(self, organization_id: int) -> dict:
+        return {
             "filter[organizations]": organization_id,
-            
             "page[size]": "100",
             "include": "flagPlayer,playerFlag,identifier,player,playerCounter,activityMessage,server,organization,organizationUser"
         }
-        return await self.helpers._make_request(method="GET", url=url, params=data)
\ No newline at end of file
+
+    async def sync_auditlogs(self, organization_id: int, store) -> dict:
+        """Copies new audit log entries into a local store, resuming from the last completed sync.
+        Pages are read newest first and paging stops once it reaches entries older than the saved cursor,
+        so the cost of a sync follows the amount of new activity rather than the size of the history.
+        The cursor only moves forward after a sync completes, so an interrupted run is picked up again next time.
+        Args:
+            organization_id (int): The organization ID
+            store (AuditLogStore|str): The store, or a path to an SQLite file to open one.
+        Returns:
+            dict: A summary of the sync: pages fetched, new entries and included resources written.
+        """
+
+        owns_store = isinstance(store, str)
+        if owns_store:
+            from battlemetrics.components.auditsync import AuditLogStore
+            store = AuditLogStore(store)
+        try:
+            since = store.cursor(organization_id)
+            newest = since
+            summary = {"pages": 0, "new_entries": 0, "included": 0, "cursor": since}
+            url = f"{self.base_url}/audit-log"
+            async for page in self.helpers._paginate(url=url, params=self._auditlog_params(organization_id)):
+                if not isinstance(page, Mapping) or 'data' not in page:
+                    raise Exception(f"Unexpected audit log response: {page}")
+                summary['pages'] += 1
+                entries = page.get('data') or []
+                known = store.known(entry['id'] for entry in entries)
+                new_entries = [entry for entry in entries if entry['id'] not in known]
+                included = page.get('included') or []
+                store.save_page(organization_id, new_entries, included)
+                summary['new_entries'] += len(new_entries)
+                summary['included'] += len(included)
+
+                timestamps = [entry['attributes']['timestamp'] for entry in entries if (entry.get('attributes') or {}).get('timestamp')]
+                if timestamps and (newest is None or max(timestamps) > newest):
+                    newest = max(timestamps)
+                if since and timestamps and min(timestamps) < since:
+                    break
+            if newest and newest != since:
+                store.set_cursor(organization_id, newest)
+            summary['cursor'] = newest
+            return summary
+        finally:
+            if owns_store:
+                store.close()
+
+    async def snapshot(self, organization_id: int, start: str = None, end: str = None, game: str = None, timeout: float = 10) -> dict:
+        """Everything the organization dashboard needs in one call: info, player stats, command activity, friends and banlists.
+        The parts are requested at the same time, each one still goes through the rate limiter. stats and player_stats
+        ask for the same thing so it is only requested once. Included resources shared between parts are kept once, by type and ID.
+        A part that fails or takes longer than timeout is left out and reported in errors, the rest is returned.
+        Args:
+            organization_id (int): The organization ID
+            start (str, optional): UTC start time for the stats and command activity. Defaults to a day ago.
+            end (str, optional): UTC end time for the stats and command activity. Defaults to now.
+            game (str, optional): Only count player stats for this game. Defaults to None.
+            timeout (float, optional): Seconds each part may take. Defaults to 10.
+        Returns:
+            dict: {"organization_id", "parts": {name: response without its included}, "included": [...], "timings": {name: seconds},
+                   "errors": {name: reason}, "complete": bool, "elapsed": seconds}
+        """
+
+        banlist = BanList(self.helpers, self.base_url)
+        requests = {
+            "info": self.info(organization_id),
+            "stats": self.stats(organization_id, start, end, game),
+            "commands_activity": self.commands_activity(organization_id, time_start=start, time_end=end),
+            "friends": self.friends_list(organization_id),
+            "banlists": banlist.list(),
+        }
+        shared = {"player_stats": "stats"}
+        timings = {}
+        errors = {}
+
+        async def run(name, request):
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(request, timeout)
+            except asyncio.TimeoutError:
+                errors[name] = f"Timed out after {timeout} seconds"
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+            finally:
+                timings[name] = round(time.perf_counter() - started, 4)
+
+        started = time.perf_counter()
+        responses = dict(zip(requests, await asyncio.gather(*(run(name, request) for name, request in requests.items()))))
+        for name, source in shared.items():
+            responses[name] = responses[source]
+            timings[name] = timings[source]
+            if source in errors:
+                errors[name] = errors[source]
+
+        parts = {}
+        included = {}
+        for name, response in responses.items():
+            if name in errors:
+                continue
+            if isinstance(response, Mapping):
+                if response.get('errors'):
+                    errors[name] = response['errors']
+                    continue
+                for resource in response.get('included') or []:
+                    included.setdefault((resource.get('type'), resource.get('id')), resource)
+                response = {key: value for key, value in response.items() if key != 'included'}
+            parts[name] = response
+
+        return {
+            "organization_id": organization_id,
+            "parts": parts,
+            "included": list(included.values()),
+            "timings": timings,
+            "errors": errors,
+            "complete": not errors,
+            "elapsed": round(time.perf_counter() - started, 4),
+        }
@@ -1,7 +1,9 @@
+import asyncio
 import datetime
 
 from datetime import datetime, timedelta
 import uuid
+from collections.abc import Mapping
 
 from battlemetrics.components.helpers import Helpers
 
@@ -9,6 +11,7 @@ class Player:
     def __init__(self, helpers: Helpers, base_url: str) -> None:
         self.helpers = helpers
         self.base_url = base_url
+        self._flag_cache = {}
     
     async def identifiers(self, player_id: int) -> dict:
         """Get player identifiers and related players and identifiers.
@@ -41,6 +44,12 @@ class Player:
         """
 
         url = f"{self.base_url}/players"
+        data = self._search_params(search=search, filter_online=filter_online, filter_servers=filter_servers, filter_organization=filter_organization,
+                                   filter_public=filter_public, flag=flag)
+        return await self.helpers._make_request(method="GET", url=url, params=data)
+
+    def _search_params(self, search: str = None, filter_online: bool = False, filter_servers: int = None, filter_organization: int = None,
+                       filter_public: bool = False, flag: str = None) -> dict:
         data = {
             "page[size]": "100",
             "include": "server,identifier,playerFlag,flagPlayer"
@@ -66,8 +75,7 @@ class Player:
 
         #if filter_game:
         #    data['server']['game'] = filter_game
-
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        return data
 
     async def info(self, identifier: int) -> dict:
 
@@ -155,7 +163,7 @@ class Player:
                 }
             ]
         }
-        return await self.helpers._make_request(method="POST", url=url, json_dict=data)
+        return await self.helpers._make_request(method="POST", url=url, json_dict=data, idempotent=True)
 
     async def session_history(self, player_id: int, filter_server: str = None, filter_organization: str = None) -> dict:
         """Returns player's session history.
@@ -201,7 +209,9 @@ class Player:
         if flag_id:
             data['data'][0]['id'] = flag_id
 
-        return await self.helpers._make_request(method="POST", url=url, json_dict=data)
+        response = await self.helpers._make_request(method="POST", url=url, json_dict=data)
+        self._update_flag_cache(player_id, flag_id, response, added=True)
+        return response
 
     async def flags(self, player_id: int) -> dict:
         """Returns all the flags on a players profile
@@ -219,6 +229,67 @@ class Player:
         url = f"{self.base_url}/players/{player_id}/relationships/flags"
         return await self.helpers._make_request(method="GET", url=url, params=data)
 
+    async def flag_ids(self, player_id: int, refresh: bool = False) -> set:
+        """Returns the IDs of the flags on a players profile. Cached per player, bulk operations and add_flag/delete_flag keep it up to date.
+        Args:
+            player_id (int): Battlemetrics ID of the targeted player.
+            refresh (bool, optional): Ignore the cache and ask the API again. Defaults to False.
+        Returns:
+            set: The flag IDs.
+        """
+
+        key = str(player_id)
+        if not refresh and key in self._flag_cache:
+            return self._flag_cache[key]
+        flag_ids = set()
+        url = f"{self.base_url}/players/{player_id}/relationships/flags"
+        async for page in self.helpers._paginate(url=url, params={"page[size]": "100", "include": "playerFlag"}):
+            if not isinstance(page, Mapping) or page.get('errors'):
+                raise Exception(f"Unable to read the flags of player {player_id}: {page}")
+            for flag_player in page.get('data') or []:
+                flag = ((flag_player.get('relationships') or {}).get('playerFlag') or {}).get('data') or {}
+                if flag.get('id'):
+                    flag_ids.add(flag['id'])
+        self._flag_cache[key] = flag_ids
+        return flag_ids
+
+    async def flagged_players(self, flag_id: str, organization_id: int = None) -> set:
+        """Returns the IDs of every player that currently has the flag, following all the pages.
+        Args:
+            flag_id (str): The flag ID.
+            organization_id (int, optional): Only look at players of this organization. Defaults to None.
+        Returns:
+            set: Battlemetrics IDs of the flagged players.
+        """
+
+        url = f"{self.base_url}/players"
+        data = {
+            "page[size]": "100",
+            "filter[playerFlags]": flag_id,
+            "filter[public]": "false",
+            "fields[player]": "name"
+        }
+        if organization_id:
+            data["filter[organization]"] = organization_id
+        player_ids = set()
+        async for page in self.helpers._paginate(url=url, params=data):
+            if not isinstance(page, Mapping) or page.get('errors'):
+                raise Exception(f"Unable to list the players flagged with {flag_id}: {page}")
+            player_ids.update(str(player['id']) for player in page.get('data') or [])
+        return player_ids
+
+    def _update_flag_cache(self, player_id: int, flag_id: str, response, added: bool) -> None:
+        flag_ids = self._flag_cache.get(str(player_id))
+        if flag_ids is None or not flag_id:
+            return
+        if isinstance(response, Mapping) and response.get('errors'):
+            # Whatever happened, the cache can no longer be trusted for this player.
+            del self._flag_cache[str(player_id)]
+        elif added:
+            flag_ids.add(flag_id)
+        else:
+            flag_ids.discard(flag_id)
+
     async def delete_flag(self, player_id: int, flag_id: str) -> dict:
         """Deletes a targeted flag from a targeted player ID
         Documentation: https://www.battlemetrics.com/developers/documentation#link-DELETE-flagPlayer-/players/{(%23%2Fdefinitions%2Fplayer%2Fdefinitions%2Fidentity)}/relationships/flags/{(%23%2Fdefinitions%2FplayerFlag%2Fdefinitions%2Fidentity)}
@@ -230,7 +301,9 @@ class Player:
         """
 
         url = f"{self.base_url}/players/{player_id}/relationships/flags/{flag_id}"
-        return await self.helpers._make_request(method="DELETE", url=url)
+        response = await self.helpers._make_request(method="DELETE", url=url)
+        self._update_flag_cache(player_id, flag_id, response, added=False)
+        return response
 
     async def coplay_info(self, player_id: int, time_start: str = None, time_end: str = None, player_names: str = None, organization_names: str = None, server_names: str = None) -> dict:
         """Gets the coplay data related to the targeted player
@@ -246,6 +319,26 @@ class Player:
             dict: A dictionary response of all the coplay users.
         """
 
+        url, data = self._coplay_params(player_id=player_id, time_start=time_start, time_end=time_end, player_names=player_names,
+                                        organization_names=organization_names, server_names=server_names)
+        return await self.helpers._make_request(method="GET", url=url, params=data)
+
+    async def coplay_pages(self, player_id: int, time_start: str = None, time_end: str = None, player_names: str = None, organization_names: str = None,
+                           server_names: str = None, max_pages: int = None):
+        """Same as coplay_info, but follows the pages and yields each one as it arrives. Takes the same filters.
+        Args:
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all of them).
+        Yields:
+            dict: Each page of coplay users.
+        """
+
+        url, data = self._coplay_params(player_id=player_id, time_start=time_start, time_end=time_end, player_names=player_names,
+                                        organization_names=organization_names, server_names=server_names)
+        async for page in self.helpers._paginate(url=url, params=data, max_pages=max_pages):
+            yield page
+
+    def _coplay_params(self, player_id: int, time_start: str = None, time_end: str = None, player_names: str = None, organization_names: str = None,
+                       server_names: str = None) -> tuple:
         if not time_start:
             now = datetime.utcnow()
             time_start = now - timedelta(days=1)
@@ -263,8 +356,7 @@ class Player:
             data["filter[organizations]"] = organization_names
         if server_names:
             data["filter[servers]"] = server_names
-        url = f"{self.base_url}/players/{player_id}/relationships/coplay"
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        return f"{self.base_url}/players/{player_id}/relationships/coplay", data
 
     async def quick_match(self, identifier: str, identifier_type: str) -> dict:
         """Player Quick Match Identifiers
@@ -298,7 +390,7 @@ class Player:
             ]
         }
 
-        return await self.helpers._make_request(method="POST", url=url, json_dict=data)
+        return await self.helpers._make_request(method="POST", url=url, json_dict=data, idempotent=True)
 
     
     async def add_ban(self, reason: str, note: str, org_id: str, banlist: str, server_id: str,
@@ -431,4 +523,59 @@ class Player:
                 }
             }
         }
-        return await self.helpers._make_request(method="POST", url=url, json_dict=data)
\ No newline at end of file
+        return await self.helpers._make_request(method="POST", url=url, json_dict=data)
+
+    async def _run_many(self, player_ids: list, action, concurrency: int) -> dict:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(player_id):
+            async with semaphore:
+                try:
+                    return await action(player_id)
+                except Exception as e:
+                    return {"status": "failed", "error": str(e)}
+
+        player_ids = list(dict.fromkeys(str(player_id) for player_id in player_ids))
+        results = await asyncio.gather(*(run(player_id) for player_id in player_ids))
+        return dict(zip(player_ids, results))
+
+    async def add_flag_many(self, player_ids: list, flag_id: str, concurrency: int = 5, skip_flagged: bool = True) -> dict:
+        """Adds a flag to many players at once. Requests still go through the client's rate limiter.
+        Args:
+            player_ids (list): Battlemetrics IDs of the players.
+            flag_id (str): An existing flag ID.
+            concurrency (int, optional): Players worked on at the same time. Defaults to 5.
+            skip_flagged (bool, optional): Look up each players flags first (cached) and skip those that already have it. Defaults to True.
+        Returns:
+            dict: Player ID -> {"status": "added", "skipped" or "failed", plus "response" or "error"}.
+        """
+
+        async def action(player_id):
+            if skip_flagged and flag_id in await self.flag_ids(player_id):
+                return {"status": "skipped"}
+            response = await self.add_flag(player_id=player_id, flag_id=flag_id)
+            if isinstance(response, Mapping) and response.get('errors'):
+                return {"status": "failed", "response": response}
+            return {"status": "added", "response": response}
+
+        return await self._run_many(player_ids, action, concurrency)
+
+    async def add_note_many(self, note: str, organization_id: int, player_ids: list, shared: bool = True, concurrency: int = 5) -> dict:
+        """Adds the same note to many players at once. Requests still go through the client's rate limiter.
+        Args:
+            note (str): The note.
+            organization_id (int): The organization ID the notes belong to.
+            player_ids (list): Battlemetrics IDs of the players.
+            shared (bool, optional): Will the notes be shared or not. Defaults to True.
+            concurrency (int, optional): Players worked on at the same time. Defaults to 5.
+        Returns:
+            dict: Player ID -> {"status": "added" or "failed", plus "response" or "error"}.
+        """
+
+        async def action(player_id):
+            response = await self.add_note(note=note, organization_id=organization_id, player_id=player_id, shared=shared)
+            if isinstance(response, Mapping) and response.get('errors'):
+                return {"status": "failed", "response": response}
+            return {"status": "added", "response": response}
+
+        return await self._run_many(player_ids, action, concurrency)
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class RateLimiter:
+    """Token bucket limiter shared by every request a client makes.
+    The bucket holds up to burst tokens and refills at requests_per_minute. Callers reserve a token
+    up front, so concurrent callers queue in order without needing a lock.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, burst: int = 15) -> None:
+        self.rate = requests_per_minute / 60
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds the caller has to wait before using it."""
+
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def try_reserve(self) -> bool:
+        """Takes a token only if one is free right now, without queueing. Returns whether it got one."""
+
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """Empties the bucket so nothing else goes out for the given number of seconds, e.g. after a 429."""
+
+        self.reserve()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    @property
+    def available(self) -> float:
+        """Tokens currently in the bucket. Negative when callers are queued."""
+
+        now = time.monotonic()
+        return min(self.burst, self._tokens + (now - self._updated) * self.rate)
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket kept in a small file so that several processes on one machine share one rate limit.
+    The file holds the token count and the time it was last updated, and every reservation happens
+    under an exclusive lock on it. A 429 seen by one worker pauses all of them.
+    Only available where fcntl is (Linux, macOS).
+    """
+
+    _STATE = struct.Struct("dd")
+
+    def __init__(self, path: str, requests_per_minute: float = 60, burst: int = 15) -> None:
+        if fcntl is None:
+            raise Exception("SharedRateLimiter needs fcntl, which this platform does not have.")
+        self.path = path
+        self.rate = requests_per_minute / 60
+        self.burst = burst
+        self._fd = None
+        self._pid = None
+
+    def _file(self) -> int:
+        # flock is held per open file, so a forked worker must open its own or it would share the parent's lock.
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _update(self, change) -> float:
+        fd = self._file()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(fd, self._STATE.size, 0)
+            now = time.time()
+            if len(raw) == self._STATE.size:
+                tokens, updated = self._STATE.unpack(raw)
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            else:
+                tokens = float(self.burst)
+            tokens, result = change(tokens)
+            os.pwrite(fd, self._STATE.pack(tokens, now), 0)
+            return result
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def reserve(self) -> float:
+        def take(tokens):
+            tokens -= 1
+            return tokens, (0.0 if tokens >= 0 else -tokens / self.rate)
+        return self._update(take)
+
+    def try_reserve(self) -> bool:
+        return self._update(lambda tokens: (tokens - 1, True) if tokens >= 1 else (tokens, False))
+
+    def penalize(self, seconds: float) -> None:
+        self._update(lambda tokens: (min(tokens - 1, -seconds * self.rate), None))
+
+    @property
+    def available(self) -> float:
+        return self._update(lambda tokens: (tokens, tokens))
+
+    def close(self) -> None:
+        if self._pid == os.getpid():
+            os.close(self._fd)
+        self._fd = None
+        self._pid = None
@@ -0,0 +1,242 @@
+from array import array
+from collections import deque
+
+from battlemetrics.components.timeseries import TimeSeries, np
+
+AGGREGATES = ("min", "max", "avg")
+
+
+def _is_numpy(series: TimeSeries) -> bool:
+    return np is not None and isinstance(series.values, np.ndarray)
+
+
+def resample(series: TimeSeries, minutes: int, how: tuple = AGGREGATES, origin: int = 0) -> dict:
+    """Buckets a raw series into fixed width windows, the same way the API does for the 30, 60 and 1440 resolutions.
+    Args:
+        series (TimeSeries): A raw series, sorted by timestamp.
+        minutes (int): Width of each bucket in minutes.
+        how (tuple, optional): Any of "min", "max", "avg", "sum" and "count". Defaults to min, max and avg.
+        origin (int, optional): Epoch second the buckets are aligned to. Defaults to 0 (UTC midnight).
+    Returns:
+        dict: One TimeSeries per aggregate, keyed by aggregate name. Timestamps are bucket starts.
+    """
+
+    width = int(minutes) * 60
+    if width <= 0:
+        raise ValueError("minutes must be positive.")
+    unknown = set(how) - {"min", "max", "avg", "sum", "count"}
+    if unknown:
+        raise ValueError(f"Unknown aggregate(s): {', '.join(sorted(unknown))}")
+
+    if not len(series):
+        return {name: TimeSeries(array('q'), array('d'), name=f"{series.name}:{minutes}:{name}") for name in how}
+
+    if _is_numpy(series):
+        values = series.values
+        buckets = (series.timestamps - origin) // width * width + origin
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        present = ~np.isnan(values)
+        counts = np.add.reduceat(present.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+        results = {
+            "min": lambda: np.fmin.reduceat(values, starts),
+            "max": lambda: np.fmax.reduceat(values, starts),
+            "sum": lambda: sums,
+            "count": lambda: counts.astype(np.float64),
+            "avg": lambda: np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0),
+        }
+        timestamps = buckets[starts]
+        return {name: TimeSeries(timestamps, results[name](), name=f"{series.name}:{minutes}:{name}") for name in how}
+
+    timestamps = array('q')
+    columns = {name: array('d') for name in how}
+    current = None
+    low = high = total = None
+    count = 0
+
+    def flush():
+        timestamps.append(current)
+        aggregates = {
+            "min": low if count else float('nan'),
+            "max": high if count else float('nan'),
+            "sum": total,
+            "count": float(count),
+            "avg": total / count if count else float('nan'),
+        }
+        for name in how:
+            columns[name].append(aggregates[name])
+
+    for timestamp, value in series:
+        bucket = (timestamp - origin) // width * width + origin
+        if bucket != current:
+            if current is not None:
+                flush()
+            current = bucket
+            low = high = None
+            total = 0.0
+            count = 0
+        if value != value:
+            continue
+        low = value if low is None or value < low else low
+        high = value if high is None or value > high else high
+        total += value
+        count += 1
+    flush()
+    return {name: TimeSeries(timestamps, columns[name], name=f"{series.name}:{minutes}:{name}") for name in how}
+
+
+def rolling(series: TimeSeries, minutes: int, how: str = "avg") -> TimeSeries:
+    """Trailing time based window over a series. Each point covers (timestamp - minutes, timestamp].
+    Args:
+        series (TimeSeries): The series, sorted by timestamp.
+        minutes (int): Length of the window in minutes.
+        how (str, optional): One of "avg", "sum", "min" or "max". Defaults to "avg".
+    Returns:
+        TimeSeries: A series with the same timestamps as the input.
+    """
+
+    width = int(minutes) * 60
+    if how not in ("avg", "sum", "min", "max"):
+        raise ValueError(f"Unknown aggregate: {how}")
+    name = f"{series.name}:rolling{minutes}:{how}"
+
+    if how in ("avg", "sum") and _is_numpy(series):
+        present = ~np.isnan(series.values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(present, series.values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(present)))
+        left = np.searchsorted(series.timestamps, series.timestamps - width, side='right')
+        right = np.arange(1, len(series) + 1)
+        window_sums = sums[right] - sums[left]
+        if how == "sum":
+            return TimeSeries(series.timestamps, window_sums, name=name)
+        window_counts = counts[right] - counts[left]
+        averages = np.divide(window_sums, window_counts, out=np.full(len(series), np.nan), where=window_counts > 0)
+        return TimeSeries(series.timestamps, averages, name=name)
+
+    # Monotonic deque for min/max, running total for avg/sum. Each point enters and leaves once.
+    window = deque()
+    extremes = deque()
+    total = 0.0
+    count = 0
+    output = array('d')
+    better = (lambda a, b: a <= b) if how == "min" else (lambda a, b: a >= b)
+    for timestamp, value in series:
+        if value == value:
+            window.append((timestamp, value))
+            total += value
+            count += 1
+            while extremes and better(value, extremes[-1][1]):
+                extremes.pop()
+            extremes.append((timestamp, value))
+        while window and window[0][0] <= timestamp - width:
+            total -= window.popleft()[1]
+            count -= 1
+        while extremes and extremes[0][0] <= timestamp - width:
+            extremes.popleft()
+        if how == "sum":
+            output.append(total)
+        elif how == "avg":
+            output.append(total / count if count else float('nan'))
+        else:
+            output.append(extremes[0][1] if extremes else float('nan'))
+    return TimeSeries(array('q', (int(t) for t in series.timestamps)), output, name=name)
+
+
+def combine(series_list: list, minutes: int = 30, how: str = "sum", origin: int = 0) -> TimeSeries:
+    """Combines several servers into one series, for example the total player count of a fleet.
+    Each series is first bucketed to the same resolution so that timestamps line up.
+    Args:
+        series_list (list): TimeSeries to combine.
+        minutes (int, optional): Resolution to align on. Defaults to 30.
+        how (str, optional): "sum" or "avg" across servers. Defaults to "sum".
+        origin (int, optional): Epoch second the buckets are aligned to. Defaults to 0.
+    Returns:
+        TimeSeries: The combined series, using each server's average within a bucket.
+    """
+
+    if how not in ("sum", "avg"):
+        raise ValueError(f"Unknown aggregate: {how}")
+    aligned = [resample(series, minutes, how=("avg",), origin=origin)["avg"] for series in series_list]
+    name = f"{how}:{minutes}"
+
+    if aligned and all(_is_numpy(series) for series in aligned):
+        timestamps = np.unique(np.concatenate([series.timestamps for series in aligned]))
+        totals = np.zeros(len(timestamps))
+        counts = np.zeros(len(timestamps))
+        for series in aligned:
+            index = np.searchsorted(timestamps, series.timestamps)
+            present = ~np.isnan(series.values)
+            totals[index[present]] += series.values[present]
+            counts[index[present]] += 1
+        # A bucket no server has data for is a gap, not zero players, and is left out like the pure Python path does.
+        reported = counts > 0
+        timestamps, totals, counts = timestamps[reported], totals[reported], counts[reported]
+        if how == "avg":
+            totals = totals / counts
+        return TimeSeries(timestamps, totals, name=name)
+
+    totals = {}
+    counts = {}
+    for series in aligned:
+        for timestamp, value in series:
+            if value != value:
+                continue
+            totals[timestamp] = totals.get(timestamp, 0.0) + value
+            counts[timestamp] = counts.get(timestamp, 0) + 1
+    timestamps = sorted(totals)
+    if how == "avg":
+        values = [totals[t] / counts[t] for t in timestamps]
+    else:
+        values = [totals[t] for t in timestamps]
+    return TimeSeries(timestamps, values, name=name)
+
+
+class Resampler:
+    """Keeps raw player count series in memory and derives every zoom level from them.
+    One raw fetch per server serves the 30, 60 and 1440 minute views, rolling windows and fleet totals.
+    """
+
+    def __init__(self) -> None:
+        self.raw = {}
+        self._derived = {}
+
+    def add(self, key, series: TimeSeries) -> None:
+        """Stores (or replaces) the raw series for a server and drops anything derived from the old one."""
+
+        self.raw[key] = series
+        self._derived = {k: v for k, v in self._derived.items() if k[0] != key}
+
+    def get(self, key, resolution="raw", how: str = "avg") -> TimeSeries:
+        """Returns the series for a server at the given resolution.
+        Args:
+            key: The server ID the raw series was stored under.
+            resolution (str|int, optional): "raw", 30, 60, 1440 or any other width in minutes. Defaults to "raw".
+            how (str, optional): "min", "max" or "avg". Defaults to "avg".
+        Returns:
+            TimeSeries: The resampled series.
+        """
+
+        if str(resolution) == "raw":
+            return self.raw[key]
+        cache_key = (key, int(resolution))
+        if cache_key not in self._derived:
+            self._derived[cache_key] = resample(self.raw[key], int(resolution), how=AGGREGATES)
+        return self._derived[cache_key][how]
+
+    def levels(self, key, resolutions: tuple = (30, 60, 1440)) -> dict:
+        """Returns the raw series and min/max/avg for each resolution, keyed like the API's resolution param."""
+
+        levels = {"raw": self.raw[key]}
+        for resolution in resolutions:
+            self.get(key, resolution)
+            levels[str(resolution)] = self._derived[(key, int(resolution))]
+        return levels
+
+    def rolling(self, key, minutes: int, how: str = "avg") -> TimeSeries:
+        return rolling(self.raw[key], minutes, how=how)
+
+    def total(self, keys: list = None, minutes: int = 30, how: str = "sum") -> TimeSeries:
+        """Sums (or averages) several servers on a common grid. Defaults to every stored server."""
+
+        keys = list(self.raw) if keys is None else keys
+        return combine([self.raw[key] for key in keys], minutes=minutes, how=how)
@@ -0,0 +1,134 @@
+import json
+import re
+from json.decoder import WHITESPACE, JSONDecoder, scanstring
+from collections.abc import Mapping
+from contextvars import ContextVar
+
+RESPONSE_MODES = ("decoded", "raw", "lazy")
+DECODER = JSONDecoder()
+JSON_OBJECT_BYTES = re.compile(rb'[ \t\n\r]*\{')
+
+# Set through Battlemetrics.response_mode(), applies to every request made inside the block, tasks started there included.
+RESPONSE_MODE = ContextVar("battlemetrics_response_mode", default="decoded")
+
+
+class RawResponse:
+    """A response exactly as the API sent it, nothing decoded.
+    Useful for relaying to a browser or caching, where decoding and encoding again would be wasted work.
+    """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: dict, body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('content-type', '')
+
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+    def __repr__(self) -> str:
+        return f"<RawResponse status={self.status} {self.content_type or 'no content type'} {len(self.body)} bytes>"
+
+
+def is_json_object(body) -> bool:
+    """Whether a JSON body is an object, judged from its first character, without decoding it."""
+
+    if isinstance(body, (bytes, bytearray)):
+        return JSON_OBJECT_BYTES.match(body) is not None
+    return isinstance(body, str) and body.startswith('{', WHITESPACE.match(body, 0).end())
+
+
+class LazyDocument(Mapping):
+    """A JSON response that is only decoded as far as it is read.
+    Reads like the dict the request would otherwise have returned. Top level members are decoded one at a time, in
+    document order, up to the one asked for: reading data leaves an included or meta that follows it undecoded.
+    Iterating, len() or a missing key decode the whole document. body keeps the original bytes, so a document
+    that is only passed on is never decoded at all.
+    The body has to be a JSON object, anything else raises TypeError on first read. A name that appears twice keeps
+    its first value, so a value that was read never changes afterwards.
+    """
+
+    __slots__ = ("body", "_members", "_text", "_position", "_complete")
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self._members = {}
+        self._text = None
+        self._position = 0
+        self._complete = False
+
+    def _decode(self, until=None) -> None:
+        """Decodes the next top level members, stopping after `until` or at the end of the document."""
+
+        if self._complete:
+            return
+        text = self._text
+        if text is None:
+            text = self._text = self.body.decode('utf-8') if isinstance(self.body, (bytes, bytearray)) else self.body
+            position = WHITESPACE.match(text, 0).end()
+            if not text.startswith('{', position):
+                # Not an object, so there are no members to read it by.
+                self._text = None
+                raise TypeError("LazyDocument needs a JSON object body, use the decoded response mode for anything else.")
+            self._position = position + 1
+        position = self._position
+        while True:
+            position = WHITESPACE.match(text, position).end()
+            if text.startswith('}', position):
+                if WHITESPACE.match(text, position + 1).end() != len(text):
+                    raise json.JSONDecodeError("Extra data", text, WHITESPACE.match(text, position + 1).end())
+                self._finish()
+                return
+            if self._members:
+                # Every member after the first is preceded by a comma.
+                if not text.startswith(',', position):
+                    raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+                position = WHITESPACE.match(text, position + 1).end()
+            if not text.startswith('"', position):
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, position)
+            name, position = scanstring(text, position + 1)
+            position = WHITESPACE.match(text, position).end()
+            if not text.startswith(':', position):
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, position)
+            value, position = DECODER.raw_decode(text, WHITESPACE.match(text, position + 1).end())
+            self._members.setdefault(name, value)
+            self._position = position
+            if name == until:
+                return
+
+    def _finish(self) -> None:
+        self._complete = True
+        self._text = None
+
+    @property
+    def document(self) -> dict:
+        self._decode()
+        return self._members
+
+    @property
+    def decoded(self) -> bool:
+        return self._complete
+
+    def __getitem__(self, key):
+        if key not in self._members:
+            self._decode(until=key)
+        return self._members[key]
+
+    def __iter__(self):
+        return iter(self.document)
+
+    def __len__(self) -> int:
+        return len(self.document)
+
+    def __repr__(self) -> str:
+        if not self.decoded:
+            return f"<LazyDocument {len(self.body)} bytes, {len(self._members)} member(s) decoded so far>"
+        return f"<LazyDocument {self.document!r}>"
@@ -0,0 +1,66 @@
+import asyncio
+import random
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aiohttp
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class RetryPolicy:
+    """Decides which failed requests are retried, how long to wait between attempts and how long a request may take.
+    Only idempotent requests are retried: the methods in retry_methods, plus POSTs the caller marks as idempotent.
+    Waits use exponential backoff with full jitter, and no attempt starts or runs past the overall deadline.
+    """
+
+    def __init__(self, max_attempts: int = 3, statuses: tuple = (500, 502, 503, 504), exceptions: tuple = None,
+                 backoff_base: float = 0.5, backoff_max: float = 10.0, deadline: float = None,
+                 connect_timeout: float = 10.0, read_timeout: float = 30.0, retry_methods: tuple = SAFE_METHODS) -> None:
+        """
+        Args:
+            max_attempts (int, optional): Attempts per request, including the first. Defaults to 3.
+            statuses (tuple, optional): HTTP statuses worth retrying. Defaults to (500, 502, 503, 504).
+            exceptions (tuple, optional): Exceptions worth retrying. Defaults to connection errors and timeouts.
+            backoff_base (float, optional): Seconds to wait after the first failure, doubled every attempt. Defaults to 0.5.
+            backoff_max (float, optional): Cap on the backoff in seconds. Defaults to 10.0.
+            deadline (float, optional): Overall seconds a request may take, retries and 429 waits included. Defaults to None (no limit).
+            connect_timeout (float, optional): Seconds to wait for a connection. Defaults to 10.0.
+            read_timeout (float, optional): Seconds to wait between reads of the response. Defaults to 30.0.
+            retry_methods (tuple, optional): Methods that are safe to repeat. Defaults to GET, HEAD, OPTIONS, PUT and DELETE.
+        """
+
+        self.max_attempts = max(1, max_attempts)
+        self.statuses = tuple(statuses)
+        self._exceptions = exceptions
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_methods = tuple(method.upper() for method in retry_methods)
+
+    @property
+    def exceptions(self) -> tuple:
+        if self._exceptions is None:
+            # aiohttp is only imported once a request is actually being made.
+            import aiohttp
+            self._exceptions = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+        return self._exceptions
+
+    @exceptions.setter
+    def exceptions(self, exceptions: tuple) -> None:
+        self._exceptions = exceptions
+
+    def can_retry(self, method: str, idempotent: bool = False) -> bool:
+        return idempotent or method.upper() in self.retry_methods
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before the next attempt, after `attempt` failed ones (1 based)."""
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def timeout(self) -> "aiohttp.ClientTimeout":
+        import aiohttp
+        return aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+
@@ -1,12 +1,24 @@
+import asyncio
 import datetime
+import time
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
 
 from datetime import datetime, timedelta
 from battlemetrics.components.helpers import Helpers
 
+if TYPE_CHECKING:
+    from battlemetrics.components.resample import Resampler
+
 class Server:
     def __init__(self, base_url: str, helpers: Helpers) -> None:
         self.base_url = base_url
         self.helpers = helpers
+        # Most command requests in flight at once on POST /servers/{id}/command, across every broadcast.
+        self.command_concurrency = 10
+        self._command_locks = {}
+        self._command_slots = None
+        self._command_loop = None
 
     async def leaderboard_info(self, server_id: int,  start: str = None, end: str = None, player: int = None) -> dict:
         """Displays the leaderboard for a specific player.
@@ -286,6 +298,90 @@ class Server:
         }
         return await self.helpers._make_request(method="POST", url=url, json_dict=chat)
 
+    def _command_primitives(self) -> None:
+        # Created on first use rather than up front, so they belong to the loop that sends the commands.
+        loop = asyncio.get_running_loop()
+        if self._command_loop is not loop:
+            self._command_loop = loop
+            self._command_locks = {}
+            self._command_slots = asyncio.Semaphore(self.command_concurrency)
+
+    def _command_lock(self, server_id: str) -> asyncio.Lock:
+        self._command_primitives()
+        lock = self._command_locks.get(server_id)
+        if lock is None:
+            lock = self._command_locks[server_id] = asyncio.Lock()
+        return lock
+
+    async def _broadcast(self, server_ids: list, send, count: int, retries: int, retry_delay: float) -> dict:
+        self._command_primitives()
+        semaphore = self._command_slots
+
+        async def run(server_id):
+            result = {"status": "sent", "attempts": 0, "responses": []}
+            started = time.perf_counter()
+            # Commands for one server go out one after another, and a later broadcast to it waits for this one.
+            async with self._command_lock(server_id):
+                while len(result['responses']) < count:
+                    index = len(result['responses'])
+                    result['attempts'] += 1
+                    try:
+                        async with semaphore:
+                            response = await send(server_id, index)
+                        failed = isinstance(response, Mapping) and response.get('errors')
+                        error = response if failed else None
+                    except Exception as e:
+                        failed, error = True, str(e) or type(e).__name__
+                    if not failed:
+                        result['responses'].append(response)
+                        continue
+                    if result['attempts'] - len(result['responses']) > retries:
+                        result['status'] = "failed"
+                        result['error'] = error
+                        break
+                    # Retry from the command that failed, those before it already went through.
+                    await asyncio.sleep(retry_delay * 2 ** (result['attempts'] - len(result['responses']) - 1))
+            result['elapsed'] = round(time.perf_counter() - started, 4)
+            return result
+
+        server_ids = list(dict.fromkeys(str(server_id) for server_id in server_ids))
+        results = await asyncio.gather(*(run(server_id) for server_id in server_ids))
+        return dict(zip(server_ids, results))
+
+    async def broadcast(self, server_ids: list, commands: list, retries: int = 0, retry_delay: float = 1.0) -> dict:
+        """Runs console commands on many servers at once, e.g. broadcast(server_ids, ["say Wipe in 10 minutes"]).
+        Servers are worked on at the same time, the commands for each server run in the given order, and commands
+        sent to a server by overlapping broadcasts never interleave. At most command_concurrency command requests are in
+        flight at once, shared by every broadcast running on this client, and they still go through the rate limiter.
+        Args:
+            server_ids (list): The servers to run the commands on.
+            commands (list): Console commands, or a single one as a string.
+            retries (int, optional): How many times a failed command is retried on a server before giving up on it. Defaults to 0.
+            retry_delay (float, optional): Seconds before the first retry, doubled for each one after. Defaults to 1.0.
+        Returns:
+            dict: Server ID -> {"status": "sent" or "failed", "attempts", "elapsed", "responses" (one per command that went through), plus "error" when failed}.
+        """
+
+        if isinstance(commands, str):
+            commands = [commands]
+        return await self._broadcast(server_ids, lambda server_id, index: self.console_command(server_id, commands[index]),
+                                     len(commands), retries, retry_delay)
+
+    async def broadcast_chat(self, server_ids: list, message: str, sender_name: str, retries: int = 0, retry_delay: float = 1.0) -> dict:
+        """Sends a chat message to many servers at once. See broadcast() for the ordering and the results.
+        Args:
+            server_ids (list): The servers to send the message to.
+            message (str): The message you wish to send
+            sender_name (str): Who do you want to send the message as?
+            retries (int, optional): How many times a failed send is retried on a server. Defaults to 0.
+            retry_delay (float, optional): Seconds before the first retry, doubled for each one after. Defaults to 1.0.
+        Returns:
+            dict: Server ID -> {"status": "sent" or "failed", "attempts", "elapsed", "responses", plus "error" when failed}.
+        """
+
+        return await self._broadcast(server_ids, lambda server_id, index: self.send_chat(server_id, message, sender_name),
+                                     1, retries, retry_delay)
+
     async def delete_rcon(self, server_id: int) -> dict:
         """
         Names on the tin, deletes the RCON for your server
@@ -324,31 +420,38 @@ class Server:
         url = f"{self.base_url}/servers/{server_id}/rcon/connect"
         return await self.helpers._make_request(method="DELETE", url=url)
 
-    async def info(self, server_id: int) -> dict:
+    async def info(self, server_id: int, include: str = None, fields: list = None) -> dict:
         """Server info.
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-server-/servers/{(%23%2Fdefinitions%2Fserver%2Fdefinitions%2Fidentity)}
         Args:
             server_id (int): The server ID
+            include (str, optional): Related resources to include. Defaults to None (players, sessions, uptime, groups and organization). Pass "" for none.
+            fields (list, optional): Only return these server attributes, e.g. ["players", "status"]. Defaults to None (all of them).
         Returns:
             dict: The server information.
         """
 
         url = f"{self.base_url}/servers/{server_id}"
-        data = {
-            "include": "player,identifier,session,serverEvent,uptime:7,uptime:30,uptime:90,serverGroup,serverDescription,organization,orgDescription,orgGroupDescription"
-        }
+        if include is None:
+            include = "player,identifier,session,serverEvent,uptime:7,uptime:30,uptime:90,serverGroup,serverDescription,organization,orgDescription,orgGroupDescription"
+        data = {}
+        if include:
+            data["include"] = include
+        if fields:
+            data["fields[server]"] = ",".join(fields)
 
         return await self.helpers._make_request(method="GET", url=url, params=data)
 
-    async def rank_history(self, server_id: int, start_time: str = None, end_time: str = None) -> dict:
+    async def rank_history(self, server_id: int, start_time: str = None, end_time: str = None, as_series: bool = False) -> dict:
         """Server Rank History
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-server-/servers/{(%22%2Fdefinitions%2Fserver%2Fdefinitions%2Fidentity)}/rank-history
         Args:
             server_id (int): The server ID
             start_time (str, optional): The UTC start time. Defaults to 0 day ago.
             end_time (str, optional): The UTC end time. Defaults to today/now.
+            as_series (bool, optional): Return a compact TimeSeries instead of the raw response. Defaults to False.
         Returns:
-            dict: Datapoint of the server rank history.
+            dict: Datapoint of the server rank history, or a TimeSeries if as_series is set.
         """
 
         if not start_time:
@@ -362,7 +465,11 @@ class Server:
             "start": start_time,
             "stop": end_time
         }
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        response = await self.helpers._make_request(method="GET", url=url, params=data)
+        if as_series:
+            from battlemetrics.components.timeseries import TimeSeries
+            return TimeSeries.from_response(response, name="rank")
+        return response
 
     async def group_rank_history(self, server_id: int, start_time: str = None, end_time: str = None) -> dict:
         """Group Rank History. The server must belong to a group.
@@ -551,7 +658,7 @@ class Server:
         }
         return await self.helpers._make_request(method="GET", url=url, params=data)
 
-    async def player_count_history(self, server_id: int, start_time: str = None, end_time: str = None, resolution: str = "raw") -> dict:
+    async def player_count_history(self, server_id: int, start_time: str = None, end_time: str = None, resolution: str = "raw", as_series: bool = False) -> dict:
         """Player Count History
         Documentation: https://www.battlemetrics.com/developers/documentation#link-GET-server-/servers/{(%23%2Fdefinitions%2Fserver%2Fdefinitions%2Fidentity)}/player-count-history
         Args:
@@ -559,8 +666,9 @@ class Server:
             start_time (str, optional): The UTC start time. Defaults to 1 day ago.
             end_time (str, optional): The UTC end time. Defaults to today/now.
             resolution (str, optional): One of: "raw" or "30" or "60" or "1440". Defaults to "raw"
+            as_series (bool, optional): Return a compact TimeSeries instead of the raw response. Defaults to False.
         Returns:
-            dict: A datapoint of the player count history.
+            dict: A datapoint of the player count history, or a TimeSeries if as_series is set.
         """
 
         if not start_time:
@@ -575,4 +683,27 @@ class Server:
             "stop": end_time,
             "resolution": resolution
         }
-        return await self.helpers._make_request(method="GET", url=url, params=data)
\ No newline at end of file
+        response = await self.helpers._make_request(method="GET", url=url, params=data)
+        if as_series:
+            from battlemetrics.components.timeseries import TimeSeries
+            return TimeSeries.from_response(response, name="player_count")
+        return response
+
+    async def player_count_levels(self, server_id: int, start_time: str = None, end_time: str = None, resolutions: tuple = (30, 60, 1440), resampler: "Resampler" = None) -> dict:
+        """Fetches the raw player count history once and derives the other resolutions locally.
+        Args:
+            server_id (int): The server ID
+            start_time (str, optional): The UTC start time. Defaults to 1 day ago.
+            end_time (str, optional): The UTC end time. Defaults to today/now.
+            resolutions (tuple, optional): Bucket widths in minutes. Defaults to (30, 60, 1440).
+            resampler (Resampler, optional): Keep the raw series in this resampler for later zooms. Defaults to None.
+        Returns:
+            dict: {"raw": TimeSeries, "30": {"min": TimeSeries, "max": TimeSeries, "avg": TimeSeries}, ...}
+        """
+
+        series = await self.player_count_history(server_id=server_id, start_time=start_time, end_time=end_time, resolution="raw", as_series=True)
+        # Deferred like the other time series imports, numpy is only loaded once a series is built.
+        from battlemetrics.components.resample import Resampler
+        resampler = resampler or Resampler()
+        resampler.add(server_id, series)
+        return resampler.levels(server_id, resolutions=resolutions)
@@ -19,6 +19,25 @@ class Session:
         """
 
         url = f"{self.base_url}/sessions"
+        data = self._info_params(filter_server=filter_server, filter_game=filter_game, filter_organizations=filter_organizations,
+                                 filter_player=filter_player, filter_identifiers=filter_identifiers)
+        return await self.helpers._make_request(method="GET", url=url, params=data)
+
+    async def info_pages(self, filter_server: int = None, filter_game: str = None, filter_organizations: int = None, filter_player: int = None,
+                         filter_identifiers: int = None, max_pages: int = None):
+        """Same as info, but follows the pages and yields each one as it arrives. Takes the same filters.
+        Args:
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all of them).
+        Yields:
+            dict: Each page of sessions.
+        """
+
+        data = self._info_params(filter_server=filter_server, filter_game=filter_game, filter_organizations=filter_organizations,
+                                 filter_player=filter_player, filter_identifiers=filter_identifiers)
+        async for page in self.helpers._paginate(url=f"{self.base_url}/sessions", params=data, max_pages=max_pages):
+            yield page
+
+    def _info_params(self, filter_server: int = None, filter_game: str = None, filter_organizations: int = None, filter_player: int = None, filter_identifiers: int = None) -> dict:
         data = {
             "include": "identifier,server,player",
             "page[size]": "100"
@@ -33,7 +52,7 @@ class Session:
             data["filter[players]"] = filter_player
         if filter_identifiers:
             data["filter[identifiers]"] = filter_identifiers
-        return await self.helpers._make_request(method="GET", url=url, params=data)
+        return data
 
     async def coplay(self, sessionid: str) -> dict:
         """Returns a list of sessions that were active during the same time as the provided session id.
@@ -0,0 +1,263 @@
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+
+
+def flatten_resource(resource: dict) -> dict:
+    """Turns a JSON:API resource into a flat row.
+    id and type are kept, attributes become "attributes.<name>" (nested objects are dotted further, lists are JSON encoded)
+    and relationships become "relationships.<name>.id", comma separated for to-many relationships.
+    """
+
+    row = {"id": resource.get('id'), "type": resource.get('type')}
+
+    def add(prefix, value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                add(f"{prefix}.{key}", inner)
+        elif isinstance(value, list):
+            row[prefix] = json.dumps(value, separators=(",", ":"), default=str)
+        else:
+            row[prefix] = value
+
+    add("attributes", resource.get('attributes') or {})
+    for name, relationship in (resource.get('relationships') or {}).items():
+        data = (relationship or {}).get('data')
+        if isinstance(data, list):
+            row[f"relationships.{name}.id"] = ",".join(str(item.get('id')) for item in data)
+        elif isinstance(data, dict):
+            row[f"relationships.{name}.id"] = data.get('id')
+    return row
+
+
+class Sink(ABC):
+    """Writes rows to a file in chunks, so memory use stays flat however many rows go through.
+    Feed it pages with consume(), e.g. `await sink.consume(api.bans.search_pages(organization_id=1))`, or rows with write().
+    Use it as a context manager, or call close() at the end so the last chunk is written.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1000, flatten: bool = True) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flatten = flatten
+        self.rows = 0
+        self._buffer = []
+
+    def write(self, resources: list) -> None:
+        for resource in resources:
+            self._buffer.append(flatten_resource(resource) if self.flatten else resource)
+            if len(self._buffer) >= self.chunk_size:
+                self.flush()
+
+    def write_page(self, page: dict) -> None:
+        if not isinstance(page, Mapping) or page.get('errors'):
+            raise Exception(f"Unable to write page: {page}")
+        data = page.get('data') or []
+        self.write(data if isinstance(data, list) else [data])
+
+    async def consume(self, pages) -> int:
+        """Writes every page of an async page iterator as it arrives.
+        Args:
+            pages (async iterator): JSON:API pages, e.g. Bans.search_pages, Session.info_pages or Organization.auditlog_pages.
+        Returns:
+            int: Rows written so far.
+        """
+
+        async for page in pages:
+            self.write_page(page)
+        self.flush()
+        return self.rows
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_chunk(self._buffer)
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    @abstractmethod
+    def _write_chunk(self, rows: list) -> None:
+        """Writes one chunk of rows, every subclass has to say how."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class NDJSONSink(Sink):
+    """One JSON object per line. Resources are written as they came unless flatten is set."""
+
+    def __init__(self, path: str, chunk_size: int = 1000, flatten: bool = False) -> None:
+        super().__init__(path, chunk_size=chunk_size, flatten=flatten)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_chunk(self, rows: list) -> None:
+        self._file.writelines(json.dumps(row, separators=(",", ":"), default=str) + "\n" for row in rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class CSVSink(Sink):
+    """Flattened rows in a CSV file.
+    Without columns, the header follows the data: columns that first show up in a later chunk are added at the end,
+    and on close() the file is rewritten once with the full header, earlier rows left empty in the new columns.
+    With columns, exactly those are written and anything else is left out.
+    """
+
+    def __init__(self, path: str, columns: list = None, chunk_size: int = 1000) -> None:
+        super().__init__(path, chunk_size=chunk_size, flatten=True)
+        self.columns = columns
+        self._fixed = columns is not None
+        self._header = None
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = None
+
+    def _write_chunk(self, rows: list) -> None:
+        if self.columns is None:
+            self.columns = []
+        if not self._fixed:
+            known = set(self.columns)
+            new_columns = [key for key in dict.fromkeys(key for row in rows for key in row) if key not in known]
+            if new_columns:
+                self.columns = self.columns + new_columns
+                self._writer = None
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+            if self._header is None:
+                self._header = list(self.columns)
+                self._writer.writeheader()
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+        if self._header is not None and self._header != self.columns:
+            self._rewrite_header()
+
+    def _rewrite_header(self) -> None:
+        # New columns were only ever appended, so older rows just lack trailing fields.
+        with open(self.path, 'r', encoding='utf-8', newline='') as source, open(f"{self.path}.tmp", 'w', encoding='utf-8', newline='') as target:
+            reader = csv.reader(source)
+            writer = csv.writer(target)
+            next(reader, None)
+            writer.writerow(self.columns)
+            width = len(self.columns)
+            for row in reader:
+                writer.writerow(row + [""] * (width - len(row)))
+        os.replace(f"{self.path}.tmp", self.path)
+        self._header = list(self.columns)
+
+
+class ParquetSink(Sink):
+    """Flattened rows in Parquet, one row group per chunk. Needs pyarrow.
+    The schema is inferred from the first chunk unless given. A Parquet file has a single schema, so when a later chunk
+    brings new columns or values that don't fit the current types, the file is closed and the rest goes to a new one
+    next to it with a widened schema: bans.parquet, then bans.1.parquet and so on. paths lists every file written,
+    read them together as one dataset. With a schema given, chunks that don't fit it raise instead.
+    """
+
+    def __init__(self, path: str, schema=None, chunk_size: int = 10000) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("ParquetSink needs pyarrow, install it with: pip install pyarrow")
+        super().__init__(path, chunk_size=chunk_size, flatten=True)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = schema
+        self._fixed = schema is not None
+        self.paths = []
+        self._placeholders = set()
+        self._writer = None
+
+    def _infer(self, rows: list):
+        pa = self._pa
+        names = list(self.schema.names) if self.schema is not None else []
+        names += [key for key in dict.fromkeys(key for row in rows for key in row) if key not in set(names)]
+        fields = []
+        for name in names:
+            try:
+                value_type = pa.array([row.get(name) for row in rows]).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed values in one column, e.g. numbers and text.
+                value_type = pa.string()
+            previous = self.schema.field(name).type if self.schema is not None and name in self.schema.names else None
+            if name in self._placeholders:
+                previous = None
+            if pa.types.is_null(value_type):
+                # No value yet: keep the type seen so far, or store it as text until a value shows what it is.
+                if previous is None:
+                    self._placeholders.add(name)
+                value_type = previous or pa.string()
+                fields.append(pa.field(name, value_type))
+                continue
+            self._placeholders.discard(name)
+            if previous is not None and previous != value_type:
+                # The type changed between chunks: widen to one that holds both (int -> float), or fall back to text.
+                try:
+                    value_type = pa.unify_schemas([pa.schema([(name, previous)]), pa.schema([(name, value_type)])],
+                                                  promote_options="permissive").field(name).type
+                except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                    value_type = pa.string()
+            fields.append(pa.field(name, value_type))
+        return pa.schema(fields)
+
+    def _table(self, rows: list, schema):
+        pa = self._pa
+        text = {field.name for field in schema if pa.types.is_string(field.type)}
+        columns = {}
+        for field in schema:
+            values = [row.get(field.name) for row in rows]
+            if field.name in text:
+                values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            columns[field.name] = values
+        return pa.Table.from_pydict(columns, schema=schema)
+
+    def _write_chunk(self, rows: list) -> None:
+        pa = self._pa
+        table = None
+        if self.schema is not None:
+            new_columns = {key for row in rows for key in row} - set(self.schema.names)
+            if new_columns and self._fixed:
+                raise Exception(f"Rows have columns that are not in the schema: {', '.join(sorted(new_columns))}")
+            # A column that only had empty values so far is text for now, its first values decide its real type.
+            typed = any(row.get(name) is not None for name in self._placeholders for row in rows) and not self._fixed
+            if not new_columns and not typed:
+                try:
+                    table = self._table(rows, self.schema)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+                    if self._fixed:
+                        raise
+        if table is None:
+            if self._writer is not None:
+                # The schema of a Parquet file can't change, continue in a new file.
+                self._writer.close()
+                self._writer = None
+            self.schema = self._infer(rows)
+            table = self._table(rows, self.schema)
+        if self._writer is None:
+            path = self._part_path(len(self.paths)) if self.paths else self.path
+            self._writer = self._pq.ParquetWriter(path, self.schema)
+            self.paths.append(path)
+        self._writer.write_table(table)
+
+    def _part_path(self, index: int) -> str:
+        stem, extension = os.path.splitext(self.path)
+        return f"{stem}.{index}{extension}"
+
+    def close(self) -> None:
+        super().close()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
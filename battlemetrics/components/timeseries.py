@@ -0,0 +1,227 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def parse_timestamp(timestamp) -> int:
+    """Converts a battlemetrics UTC timestamp into epoch seconds.
+    Args:
+        timestamp (str|int|float|datetime): Something like "2024-01-01T00:00:00.000Z".
+    Returns:
+        int: Seconds since the epoch.
+    """
+
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, datetime):
+        if not timestamp.tzinfo:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return int(timestamp.timestamp())
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return int(datetime.fromisoformat(timestamp).timestamp())
+
+
+class TimeSeries:
+    """Columnar time series. Timestamps are int64 epoch seconds and values are float64.
+    Uses numpy arrays when numpy is installed, otherwise the standard library array module.
+    Slicing returns a view over the same memory rather than a copy.
+    """
+
+    def __init__(self, timestamps, values, name: str = None) -> None:
+        if len(timestamps) != len(values):
+            raise ValueError("timestamps and values must be the same length.")
+        self.name = name
+        if isinstance(timestamps, memoryview) or (np is not None and isinstance(timestamps, np.ndarray)):
+            # Already a view from another series, keep sharing the buffer.
+            self._timestamps = timestamps
+            self._values = values
+        elif np is not None and isinstance(timestamps, array) and isinstance(values, array):
+            self._timestamps = np.frombuffer(timestamps, dtype=np.int64)
+            self._values = np.frombuffer(values, dtype=np.float64)
+        elif np is not None:
+            self._timestamps = np.asarray(timestamps, dtype=np.int64)
+            self._values = np.asarray(values, dtype=np.float64)
+        else:
+            self._timestamps = memoryview(array('q', timestamps))
+            self._values = memoryview(array('d', values))
+
+    @classmethod
+    def from_datapoints(cls, datapoints: list, name: str = None, field: str = "value", metric: str = None, group: str = None) -> "TimeSeries":
+        """Builds a series from a list of battlemetrics dataPoint objects.
+        Args:
+            datapoints (list): The "data" list of a time series response.
+            name (str, optional): A label for the series. Defaults to None.
+            field (str, optional): The attribute holding the value. Defaults to "value".
+            metric (str, optional): Only keep datapoints with this metric name. Needed when the datapoints hold several metrics. Defaults to None.
+            group (str, optional): Only keep datapoints in this group. Defaults to None.
+        Raises:
+            ValueError: No metric was given and the datapoints hold several, they would be merged into one series.
+        Returns:
+            TimeSeries: The series, sorted by timestamp.
+        """
+
+        if not metric:
+            names = {point.get('attributes', point).get('name') for point in datapoints} - {None}
+            if len(names) > 1:
+                raise ValueError(f"The datapoints hold several metrics ({', '.join(sorted(names))}), pick one with metric.")
+
+        timestamps = array('q')
+        values = array('d')
+        for point in datapoints:
+            attributes = point.get('attributes', point)
+            if metric and attributes.get('name', metric) != metric:
+                continue
+            if group and attributes.get('group', group) != group:
+                continue
+            value = attributes.get(field)
+            timestamps.append(parse_timestamp(attributes['timestamp']))
+            values.append(float('nan') if value is None else float(value))
+
+        if any(timestamps[i] > timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            timestamps = array('q', (timestamps[i] for i in order))
+            values = array('d', (values[i] for i in order))
+        return cls(timestamps, values, name=name)
+
+    @classmethod
+    def from_response(cls, response: dict, name: str = None, field: str = "value", metric: str = None, group: str = None) -> "TimeSeries":
+        """Builds a series from a raw time series response.
+        Args:
+            response (dict): The response from the API.
+            name (str, optional): A label for the series. Defaults to None.
+            field (str, optional): The attribute holding the value. Defaults to "value".
+            metric (str, optional): Only keep datapoints with this metric name. Defaults to None.
+            group (str, optional): Only keep datapoints in this group. Defaults to None.
+        Returns:
+            TimeSeries: The series.
+        """
+
+        data = response.get('data') if isinstance(response, Mapping) else None
+        if not isinstance(data, list):
+            raise ValueError(f"Response does not contain a list of datapoints: {response}")
+        return cls.from_datapoints(data, name=name, field=field, metric=metric, group=group)
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def nbytes(self) -> int:
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def __iter__(self):
+        return zip(self._timestamps, self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TimeSeries(self._timestamps[index], self._values[index], name=self.name)
+        return int(self._timestamps[index]), float(self._values[index])
+
+    def __repr__(self) -> str:
+        return f"<TimeSeries name={self.name!r} points={len(self)}>"
+
+    def between(self, start=None, end=None) -> "TimeSeries":
+        """Returns a view of the datapoints where start <= timestamp < end.
+        Args:
+            start (str|int|datetime, optional): Start of the window. Defaults to the first datapoint.
+            end (str|int|datetime, optional): End of the window. Defaults to the last datapoint.
+        Returns:
+            TimeSeries: A view sharing memory with this series.
+        """
+
+        lo = 0
+        hi = len(self)
+        if np is not None and isinstance(self._timestamps, np.ndarray):
+            if start is not None:
+                lo = int(np.searchsorted(self._timestamps, parse_timestamp(start), side='left'))
+            if end is not None:
+                hi = int(np.searchsorted(self._timestamps, parse_timestamp(end), side='left'))
+        else:
+            if start is not None:
+                lo = bisect_left(self._timestamps, parse_timestamp(start))
+            if end is not None:
+                hi = bisect_left(self._timestamps, parse_timestamp(end))
+        return self[lo:hi]
+
+    def at(self, timestamp) -> float:
+        """Returns the value of the latest datapoint at or before the given timestamp."""
+
+        index = bisect_right(self._timestamps, parse_timestamp(timestamp)) - 1
+        if index < 0:
+            raise KeyError(timestamp)
+        return float(self._values[index])
+
+    def _require_points(self) -> None:
+        if not len(self):
+            raise ValueError("The time series is empty.")
+
+    def _all_missing(self) -> bool:
+        # Both backends return nan, without a warning, when there is no value to work with.
+        if np is not None and isinstance(self._values, np.ndarray):
+            return bool(np.isnan(self._values).all())
+        return not any(v == v for v in self._values)
+
+    def min(self) -> float:
+        self._require_points()
+        if self._all_missing():
+            return float('nan')
+        if np is not None and isinstance(self._values, np.ndarray):
+            return float(np.nanmin(self._values))
+        return min(v for v in self._values if v == v)
+
+    def max(self) -> float:
+        self._require_points()
+        if self._all_missing():
+            return float('nan')
+        if np is not None and isinstance(self._values, np.ndarray):
+            return float(np.nanmax(self._values))
+        return max(v for v in self._values if v == v)
+
+    def sum(self) -> float:
+        if np is not None and isinstance(self._values, np.ndarray):
+            return float(np.nansum(self._values))
+        return float(sum(v for v in self._values if v == v))
+
+    def mean(self) -> float:
+        self._require_points()
+        if self._all_missing():
+            return float('nan')
+        if np is not None and isinstance(self._values, np.ndarray):
+            return float(np.nanmean(self._values))
+        values = [v for v in self._values if v == v]
+        return sum(values) / len(values)
+
+    def percentile(self, q: float) -> float:
+        """Returns the q-th percentile (0-100) using linear interpolation, ignoring missing values."""
+
+        self._require_points()
+        if not 0 <= q <= 100:
+            raise ValueError("q must be between 0 and 100.")
+        if self._all_missing():
+            return float('nan')
+        if np is not None and isinstance(self._values, np.ndarray):
+            return float(np.nanpercentile(self._values, q))
+        values = sorted(v for v in self._values if v == v)
+        position = (len(values) - 1) * q / 100
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def to_list(self) -> list:
+        """Returns the series as a list of (timestamp, value) tuples."""
+
+        return [(int(t), float(v)) for t, v in zip(self._timestamps, self._values)]
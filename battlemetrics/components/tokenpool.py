@@ -0,0 +1,171 @@
+import re
+from urllib.parse import urlsplit
+from collections.abc import Mapping
+
+from battlemetrics.components.ratelimit import RateLimiter
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+ORGANIZATION_URL = re.compile(r"/organizations/(\d+)")
+ORGANIZATION_PARAMS = ("filter[organizations]", "filter[organization]")
+
+# Token scope each endpoint needs, as (path pattern, resource). The scope is "<resource>:<action>" with the action
+# read for GET, create for POST, edit for PATCH and delete for DELETE, e.g. "ban:create". The first match wins and
+# endpoints that are not listed need no particular scope. TokenPool takes its own table through endpoint_scopes.
+ENDPOINT_SCOPES = (
+    (re.compile(r"^/bans/export"), "ban"),
+    (re.compile(r"^/bans(/|$)"), "ban"),
+    (re.compile(r"^/ban-lists(/|$)"), "ban-list"),
+    (re.compile(r"^/players/\d+/relationships/notes"), "player-notes"),
+    (re.compile(r"^/players/\d+/relationships/flags"), "player-flags"),
+    (re.compile(r"^/player-flags(/|$)"), "player-flags"),
+    (re.compile(r"^/servers/\d+/command"), "rcon"),
+    (re.compile(r"^/audit-log"), "audit-log"),
+)
+SCOPE_ACTIONS = {"GET": "read", "HEAD": "read", "OPTIONS": "read", "POST": "create", "PUT": "edit", "PATCH": "edit", "DELETE": "delete"}
+
+
+def required_scope(method: str, url: str, endpoint_scopes: tuple = ENDPOINT_SCOPES) -> str:
+    """Returns the token scope a request needs, or None if any token will do."""
+
+    path = urlsplit(url).path
+    for pattern, resource in endpoint_scopes:
+        if pattern.search(path):
+            return f"{resource}:{SCOPE_ACTIONS.get(method.upper(), 'read')}"
+    return None
+
+
+class PooledToken:
+    """One API token in a TokenPool, with its own rate limiter and load counters."""
+
+    def __init__(self, api_key: str, organization_ids: list = None, limiter: RateLimiter = None) -> None:
+        self.api_key = api_key
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.organization_ids = {str(organization_id) for organization_id in organization_ids or []}
+        self.limiter = limiter
+        self.scopes = None
+        self.active = True
+        self.in_flight = 0
+        self.requests = 0
+
+    def has_scope(self, scope: str) -> bool:
+        # Scopes are unknown until TokenPool.load_scopes has run, assume the token can do it.
+        return self.scopes is None or scope in self.scopes
+
+    def __repr__(self) -> str:
+        return f"<PooledToken ...{self.api_key[-6:]} orgs={sorted(self.organization_ids)} in_flight={self.in_flight}>"
+
+
+class TokenPool:
+    """Spreads requests over several API tokens.
+    Requests that belong to an organization, by URL, filter or request body, go to the token registered for it, reads
+    included, since another organization's token would get a 403 or see less. Other reads go to any active token,
+    either round robin or to the least loaded one, and other writes to the first token.
+    Once load_scopes has run, a token is only picked for endpoints whose scope it has, see ENDPOINT_SCOPES.
+    """
+
+    def __init__(self, strategy: str = "round_robin", requests_per_minute: float = 60, burst: int = 15, endpoint_scopes: tuple = ENDPOINT_SCOPES) -> None:
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError("strategy must be round_robin or least_loaded.")
+        self.strategy = strategy
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.endpoint_scopes = endpoint_scopes
+        self.tokens = []
+        self._by_organization = {}
+        self._next = 0
+
+    def add(self, api_key: str, organization_ids: list = None, limiter: RateLimiter = None) -> PooledToken:
+        """Adds a token. organization_ids are the organizations whose writes must use this token."""
+
+        if limiter is None and self.requests_per_minute:
+            limiter = RateLimiter(requests_per_minute=self.requests_per_minute, burst=self.burst)
+        token = PooledToken(api_key=api_key, organization_ids=organization_ids, limiter=limiter)
+        self.tokens.append(token)
+        for organization_id in token.organization_ids:
+            self._by_organization.setdefault(organization_id, token)
+        return token
+
+    def _eligible(self, scope: str = None) -> list:
+        tokens = [token for token in self.tokens if token.active and (scope is None or token.has_scope(scope))]
+        if not tokens:
+            raise Exception(f"No active token in the pool{f' has the {scope} scope' if scope else ''}.")
+        return tokens
+
+    def for_read(self, scope: str = None) -> PooledToken:
+        tokens = self._eligible(scope)
+        if self.strategy == "least_loaded":
+            # Fewest requests in flight first, then whichever bucket has the most tokens left.
+            return min(tokens, key=lambda token: (token.in_flight, -(token.limiter.available if token.limiter else 0)))
+        token = tokens[self._next % len(tokens)]
+        self._next += 1
+        return token
+
+    def for_write(self, organization_id=None, scope: str = None) -> PooledToken:
+        token = self.for_organization(organization_id, scope)
+        if token:
+            return token
+        if self.tokens[0].active and (scope is None or self.tokens[0].has_scope(scope)):
+            return self.tokens[0]
+        return self._eligible(scope)[0]
+
+    def for_organization(self, organization_id, scope: str = None) -> PooledToken:
+        """Returns the token registered for an organization, or None if there is none that can do it."""
+
+        if organization_id is None:
+            return None
+        token = self._by_organization.get(str(organization_id))
+        if token and token.active and (scope is None or token.has_scope(scope)):
+            return token
+        return None
+
+    def for_request(self, method: str, url: str, json_dict: dict = None, params: dict = None) -> PooledToken:
+        scope = required_scope(method, url, self.endpoint_scopes)
+        organization_id = self.owning_organization(url, json_dict, params)
+        if method.upper() in READ_METHODS:
+            return self.for_organization(organization_id, scope) or self.for_read(scope)
+        return self.for_write(organization_id, scope)
+
+    @staticmethod
+    def owning_organization(url: str, json_dict: dict = None, params: dict = None):
+        """Works out which organization a request belongs to, from the URL, an organization filter or the request body."""
+
+        match = ORGANIZATION_URL.search(url)
+        if match:
+            return match.group(1)
+        for name in ORGANIZATION_PARAMS:
+            organization_id = (params or {}).get(name)
+            # A filter on several organizations can't be pinned to one token.
+            if organization_id is not None and "," not in str(organization_id):
+                return str(organization_id)
+        data = (json_dict or {}).get('data') if isinstance(json_dict, dict) else None
+        if isinstance(data, dict):
+            organization = (((data.get('relationships') or {}).get('organization') or {}).get('data') or {})
+            return organization.get('id')
+        return None
+
+    async def load_scopes(self, introspect) -> None:
+        """Looks up every token's scopes and drops inactive tokens from rotation.
+        Args:
+            introspect (coroutine function): Takes a token and returns the oauth introspection, e.g. Battlemetrics.check_api_scopes.
+        """
+
+        for token in self.tokens:
+            response = await introspect(token.api_key)
+            if not isinstance(response, Mapping):
+                continue
+            token.active = bool(response.get('active', True))
+            if response.get('scope') is not None:
+                token.scopes = set(str(response['scope']).split())
+
+    def stats(self) -> list:
+        """Returns per token counters, for logging or dashboards."""
+
+        return [{
+            "token": f"...{token.api_key[-6:]}",
+            "organizations": sorted(token.organization_ids),
+            "active": token.active,
+            "scopes": sorted(token.scopes) if token.scopes is not None else None,
+            "in_flight": token.in_flight,
+            "requests": token.requests,
+            "available": token.limiter.available if token.limiter else None,
+        } for token in self.tokens]
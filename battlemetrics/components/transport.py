@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import json
+import os
+import time
+
+TRANSPORT_MODES = ("passthrough", "record", "replay")
+
+# Time windows that default to "now" (e.g. the last day of metrics or command stats) differ on every run,
+# so by default they are left out when matching a request against the cassette.
+TIME_WINDOW_PARAMS = ("start", "stop", "filter[range]", "filter[period]", "filter[timestamp]", "metrics[0][range]")
+
+
+class Transport:
+    """Sits under every HTTP request the client makes, to record API traffic to a cassette file and play it back offline.
+    "record" sends requests as usual and keeps each request and response, save() writes them to the cassette.
+    "replay" answers from the cassette without touching the network, optionally after a simulated latency.
+    "passthrough" just sends requests. Request headers, and so the API token, are never written to the cassette.
+    Replayed requests are matched on method, URL, params and JSON body, leaving out ignore_params, or on whatever
+    matcher returns. A request recorded several times, e.g. a poll, gets its responses back in the recorded order and
+    the last one after that. Replays skip the client's rate limiter, so their timing only comes from latency.
+    """
+
+    def __init__(self, mode: str = "passthrough", path: str = None, latency=None, ignore_params: tuple = TIME_WINDOW_PARAMS,
+                 matcher=None) -> None:
+        """
+        Args:
+            mode (str, optional): "passthrough", "record" or "replay". Defaults to "passthrough".
+            path (str, optional): The cassette file. Needed to record or replay. Defaults to None.
+            latency (float|str, optional): Seconds to wait before each replayed response, or "recorded" for the time
+                it took when it was recorded. Defaults to None (answer at once).
+            ignore_params (tuple, optional): Params left out when matching, e.g. time windows. Defaults to TIME_WINDOW_PARAMS.
+            matcher (callable, optional): Takes (method, url, params, json_dict) and returns a hashable key, requests with
+                the same key match. Replaces the default matching entirely. Defaults to None.
+        """
+
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"mode must be one of {', '.join(TRANSPORT_MODES)}.")
+        if mode != "passthrough" and not path:
+            raise ValueError(f"A cassette path is needed to {mode}.")
+        if latency is not None and latency != "recorded" and not isinstance(latency, (int, float)):
+            raise ValueError('latency must be a number of seconds or "recorded".')
+        self.mode = mode
+        self.path = path
+        self.latency = latency
+        self.ignore_params = set(ignore_params or ())
+        self.matcher = matcher
+        self.interactions = []
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._responses = {}
+        self._served = {}
+        self._unsaved = False
+        if mode == "replay":
+            self.load()
+
+    def _key(self, method: str, url: str, params: dict, json_dict: dict):
+        if self.matcher is not None:
+            return self.matcher(method.upper(), url, params, json_dict)
+        params = sorted((str(key), str(value)) for key, value in (params or {}).items() if key not in self.ignore_params)
+        return json.dumps([method.upper(), url, params, json_dict], sort_keys=True, default=str)
+
+    def load(self, path: str = None) -> None:
+        """Reads a cassette and indexes its responses for replay."""
+
+        with open(path or self.path, 'r', encoding='utf-8') as f:
+            self.interactions = json.load(f).get('interactions') or []
+        self._responses = {}
+        self._served = {}
+        for interaction in self.interactions:
+            request = interaction['request']
+            key = self._key(request['method'], request['url'], request.get('params'), request.get('json'))
+            self._responses.setdefault(key, []).append(interaction['response'])
+
+    def save(self, path: str = None) -> str:
+        """Writes what has been recorded to the cassette, atomically. Returns the path."""
+
+        path = path or self.path
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "interactions": self.interactions}, f, indent=1, default=str)
+        os.replace(f"{path}.tmp", path)
+        self._unsaved = False
+        return path
+
+    async def send(self, send, method: str, url: str, params: dict, json_dict: dict, headers: dict, to_file: str = None) -> tuple:
+        """Handles one request.
+        Args:
+            send (coroutine function): Sends the request over the network, called with the same arguments minus send.
+        Returns:
+            tuple: (status, headers, body), like Helpers._send_once.
+        """
+
+        if self.mode == "replay":
+            return await self._replay(method, url, params, json_dict, to_file)
+        if self.mode == "passthrough":
+            return await send(method=method, url=url, params=params, json_dict=json_dict, headers=headers, to_file=to_file)
+
+        started = time.perf_counter()
+        status, response_headers, body = await send(method=method, url=url, params=params, json_dict=json_dict, headers=headers, to_file=to_file)
+        elapsed = time.perf_counter() - started
+        recorded_body = body
+        if body is None:
+            # Streamed into to_file, keep a copy of what was written.
+            with open(to_file, 'rb') as f:
+                recorded_body = f.read()
+        self.interactions.append({
+            "request": {"method": method.upper(), "url": url, "params": params, "json": json_dict},
+            "response": {"status": status, "headers": response_headers, **self._encode(recorded_body), "latency": round(elapsed, 4)},
+        })
+        self.recorded += 1
+        self._unsaved = True
+        return status, response_headers, body
+
+    @staticmethod
+    def _encode(body: bytes) -> dict:
+        # Text bodies stay readable in the cassette, anything else (e.g. a binary export) is stored as base64.
+        try:
+            return {"body": body.decode('utf-8'), "encoding": "utf-8"}
+        except UnicodeDecodeError:
+            return {"body": base64.b64encode(body).decode('ascii'), "encoding": "base64"}
+
+    async def _replay(self, method: str, url: str, params: dict, json_dict: dict, to_file: str = None) -> tuple:
+        key = self._key(method, url, params, json_dict)
+        responses = self._responses.get(key)
+        if not responses:
+            self.misses += 1
+            raise Exception(f"No recorded response for {method} {url} with params {params} in {self.path}.")
+        served = self._served.get(key, 0)
+        self._served[key] = served + 1
+        response = responses[min(served, len(responses) - 1)]
+
+        delay = response.get('latency') if self.latency == "recorded" else self.latency
+        if delay:
+            await asyncio.sleep(delay)
+        self.replayed += 1
+
+        status = response['status']
+        body = base64.b64decode(response['body']) if response.get('encoding') == "base64" else response['body'].encode('utf-8')
+        if to_file and status < 300:
+            with open(f"{to_file}.part", 'wb') as f:
+                f.write(body)
+            os.replace(f"{to_file}.part", to_file)
+            body = None
+        return status, dict(response.get('headers') or {}), body
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "recorded": self.recorded, "replayed": self.replayed, "misses": self.misses, "unsaved": self._unsaved}
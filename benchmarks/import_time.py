@@ -0,0 +1,63 @@
+"""Measures how long `from battlemetrics import Battlemetrics` takes in a fresh interpreter.
+
+    python benchmarks/import_time.py [--runs 20] [--max-ms 60]
+
+Each run starts a new Python process so nothing is cached in sys.modules. Exits with 1 if the median import
+takes longer than --max-ms, or if the import pulls in a module that should only load on first use.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# These are only needed once a request is sent, a series is built or an audit log is synced.
+DEFERRED = ("aiohttp", "numpy", "sqlite3")
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+from battlemetrics import Battlemetrics
+Battlemetrics("token")
+elapsed = time.perf_counter() - start
+print(elapsed * 1000)
+print(",".join(name for name in {DEFERRED!r} if name in sys.modules))
+"""
+
+
+def run_once() -> tuple:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True).stdout.splitlines()
+    loaded = output[1].split(",") if len(output) > 1 and output[1] else []
+    return float(output[0]), loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Fresh interpreters to time. Defaults to 20.")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median import is slower than this.")
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.runs):
+        elapsed, modules = run_once()
+        timings.append(elapsed)
+        loaded.update(modules)
+
+    median = statistics.median(timings)
+    print(f"import + construct: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms over {args.runs} runs")
+    failed = False
+    if loaded:
+        print(f"imported eagerly but should be deferred: {', '.join(sorted(loaded))}")
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"median is over the {args.max_ms:g} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import asyncio
+
+from battlemetrics.components.bans import Bans
+from battlemetrics.components.coalesce import WriteCoalescer
+from battlemetrics.components.helpers import Helpers
+
+BASE_URL = "https://api.battlemetrics.com"
+
+
+def fake_bans(note: str = None, fail_writes: bool = False) -> tuple:
+    """Bans over a fake _make_request that keeps one ban in memory. Returns (bans, list of (method, url) calls)."""
+
+    helpers = Helpers("token", coalesce_window=0.05)
+    ban = {"type": "ban", "id": "1", "attributes": {"reason": "cheating", "note": note}}
+    calls = []
+
+    async def make_request(method, url, params=None, json_dict=None, **kwargs):
+        calls.append((method, url))
+        await asyncio.sleep(0.01)
+        if method == "GET":
+            return {"data": {**ban, "attributes": dict(ban["attributes"])}}
+        if fail_writes:
+            raise Exception("422 Unprocessable Entity")
+        ban["attributes"] = dict(json_dict["data"]["attributes"])
+        return {"data": {**ban, "attributes": dict(ban["attributes"])}}
+
+    helpers._make_request = make_request
+    return Bans(helpers=helpers, base_url=BASE_URL), calls
+
+
+def test_updates_close_together_share_one_read_and_write():
+    bans, calls = fake_bans()
+
+    async def main():
+        return await asyncio.gather(*(bans.update("1", note=line, append=True) for line in ("a", "b", "c")))
+
+    results = asyncio.run(main())
+    assert [method for method, _ in calls] == ["GET", "PATCH"]
+    # The note started out empty, so there is no newline in front of the first line.
+    assert all(result["data"]["attributes"]["note"] == "a\nb\nc" for result in results)
+
+
+def test_updates_to_one_ban_are_applied_in_order():
+    bans, _ = fake_bans(note="orig")
+
+    async def main():
+        return await asyncio.gather(bans.update("1", note="appended", append=True), bans.update("1", note="replaced"),
+                                    bans.update("1", note="last", append=True))
+
+    results = asyncio.run(main())
+    assert results[-1]["data"]["attributes"]["note"] == "replaced\nlast"
+
+
+def test_flushes_for_one_key_never_overlap():
+    coalescer = WriteCoalescer(window=0.01)
+    events = []
+
+    async def flush(values):
+        events.append(("start", values))
+        await asyncio.sleep(0.05)
+        events.append(("end", values))
+        return values
+
+    async def main():
+        first = asyncio.ensure_future(coalescer.submit("key", 1, flush))
+        # Lands while the first flush is running, so it has to wait for the next one.
+        await asyncio.sleep(0.03)
+        second = asyncio.ensure_future(coalescer.submit("key", 2, flush))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == [[1], [2]]
+    assert events == [("start", [1]), ("end", [1]), ("start", [2]), ("end", [2])]
+    assert coalescer.stats() == {"submitted": 2, "flushes": 2, "pending": 0}
+
+
+def test_a_failed_write_reaches_every_caller():
+    bans, calls = fake_bans(note="orig", fail_writes=True)
+
+    async def main():
+        return await asyncio.gather(bans.update("1", note="x", append=True), bans.update("1", reason="alt"), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [method for method, _ in calls] == ["GET", "PATCH"]
+    assert [str(result) for result in results] == ["422 Unprocessable Entity"] * 2
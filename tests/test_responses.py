@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from battlemetrics.components.responses import LazyDocument, is_json_object
+
+
+def test_reading_one_member_leaves_the_rest_undecoded():
+    document = LazyDocument(b'{"data": {"id": "1"}, "included": [{"id": "2"}], "meta": {"total": 1}}')
+    assert document["data"] == {"id": "1"}
+    assert not document.decoded
+    assert dict(document) == {"data": {"id": "1"}, "included": [{"id": "2"}], "meta": {"total": 1}}
+    assert document.decoded
+
+
+def test_whitespace_everywhere_json_allows_it():
+    body = ' \r\n\t{ \n"data" \t:\r\n[1, 2] ,\n\t"meta"\n:\t{}\n}\n\t '
+    document = LazyDocument(body.encode())
+    assert document["data"] == [1, 2]
+    assert document.document == json.loads(body)
+
+
+def test_escaped_member_names():
+    body = r'{"da\"ta": 1, "\u0064ata": 2, "back\\slash": 3}'
+    document = LazyDocument(body.encode())
+    assert document["data"] == 2
+    assert document['da"ta'] == 1
+    assert document.document == json.loads(body)
+
+
+def test_a_duplicate_name_keeps_the_value_already_read():
+    document = LazyDocument(b'{"data": 1, "meta": {}, "data": 2}')
+    assert document["data"] == 1
+    assert len(document) == 2
+    assert document["data"] == 1
+
+
+def test_empty_object():
+    document = LazyDocument(b'{ }')
+    assert len(document) == 0
+    assert "data" not in document
+
+
+@pytest.mark.parametrize("body", [b'{', b'{"data"', b'{"data": ', b'{"data": [1, 2', b'{"data": 1', b'{"data": 1,', b'{"data": 1 "meta": 2}',
+                                  b'{, "data": 1}', b'{"data": 1}}'])
+def test_truncated_or_malformed_bodies_raise(body):
+    with pytest.raises(json.JSONDecodeError):
+        dict(LazyDocument(body))
+
+
+@pytest.mark.parametrize("body", [b'[{"id": "1"}]', b'"text"', b'  42'])
+def test_bodies_that_are_not_objects(body):
+    assert not is_json_object(body)
+    with pytest.raises(TypeError):
+        LazyDocument(body)["data"]
+    assert is_json_object(b' \n{"data": []}')
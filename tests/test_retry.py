@@ -0,0 +1,62 @@
+import asyncio
+import json
+import time
+
+from battlemetrics.components.helpers import Helpers
+from battlemetrics.components.retry import RetryPolicy
+from battlemetrics.components.tokenpool import TokenPool
+from battlemetrics.components.transport import Transport
+
+URL = "https://api.battlemetrics.com/players"
+
+
+def rate_limited(retry_after: float) -> dict:
+    return {"status": 429, "headers": {"content-type": "application/json", "retry-after": str(retry_after)},
+            "body": json.dumps({"errors": [{"status": "429", "title": "Too Many Requests"}]}), "encoding": "utf-8"}
+
+
+def ok() -> dict:
+    return {"status": 200, "headers": {"content-type": "application/json"}, "body": json.dumps({"data": []}), "encoding": "utf-8"}
+
+
+def replaying(tmp_path, responses: list) -> Transport:
+    path = tmp_path / "cassette.json"
+    interactions = [{"request": {"method": "GET", "url": URL, "params": None, "json": None}, "response": response} for response in responses]
+    path.write_text(json.dumps({"version": 1, "interactions": interactions}))
+    return Transport("replay", str(path))
+
+
+def test_rate_limit_waits_stop_at_the_deadline(tmp_path):
+    transport = replaying(tmp_path, [rate_limited(1)])
+    helpers = Helpers("token", retry_policy=RetryPolicy(max_attempts=10, deadline=1.5), circuit_breakers=False, transport=transport)
+    started = time.monotonic()
+    response = asyncio.run(helpers._make_request("GET", URL))
+    assert time.monotonic() - started < 2.5
+    assert transport.replayed == 2
+    assert response["errors"][0]["status"] == "429"
+
+
+def test_rate_limit_retries_stop_at_max_attempts(tmp_path):
+    transport = replaying(tmp_path, [rate_limited(0.01)])
+    helpers = Helpers("token", retry_policy=RetryPolicy(max_attempts=3), circuit_breakers=False, transport=transport)
+    response = asyncio.run(helpers._make_request("GET", URL))
+    assert transport.replayed == 3
+    assert response["errors"][0]["status"] == "429"
+
+
+def test_rate_limited_request_is_sent_again(tmp_path):
+    transport = replaying(tmp_path, [rate_limited(0.01), ok()])
+    helpers = Helpers("token", circuit_breakers=False, transport=transport)
+    assert asyncio.run(helpers._make_request("GET", URL)) == {"data": []}
+    assert transport.replayed == 2
+
+
+def test_rate_limited_read_moves_to_another_pooled_token(tmp_path):
+    transport = replaying(tmp_path, [rate_limited(0.01), ok()])
+    pool = TokenPool(requests_per_minute=None)
+    first = pool.add("first-token")
+    second = pool.add("second-token")
+    helpers = Helpers("first-token", token_pool=pool, circuit_breakers=False, transport=transport)
+    assert asyncio.run(helpers._make_request("GET", URL)) == {"data": []}
+    assert (first.requests, second.requests) == (1, 1)
+    assert first.in_flight == second.in_flight == 0